@@ -1,14 +1,25 @@
-from flask import Flask, request, jsonify, render_template
-import json
-import sqlite3
-import threading
+from flask import Flask, Response, g, request, jsonify, render_template
 import time
 import requests
 import os
 from datetime import datetime
-from typing import Optional, Dict, List
+
+from config import (
+    DB_DIR, DB_PATH,
+    SELF_PING_INTERVAL, RATE_LIMIT_ENABLED, RATE_LIMIT_DB_PATH, TRUST_REQUEST_START
+)
+from concurrency import gevent_active, run_blocking, spawn_background
+from trade_simulator import TradeSimulator
+from trade_export import iter_export
+import json_codec
+from webhook_schema import parse_webhook, SchemaError, MAX_WEBHOOK_BYTES
+from rate_limiter import RateLimiter, client_id
+from latency import LatencyTracker, parse_signal_time, request_received_at
+from risk_engine import get_risk_report, DEFAULT_PATHS, DEFAULT_RUIN_FRACTION
 
 app = Flask(__name__)
+app.config['MAX_CONTENT_LENGTH'] = 64 * 1024
+json_codec.install(app)
 
 # Adiciona CORS headers para todas as respostas
 @app.after_request
@@ -18,478 +29,40 @@ def after_request(response):
     response.headers.add('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
     return response
 
-# Configurações
-INITIAL_BALANCE = 55.0  # Saldo inicial de $55 USDT
-COMMISSION_RATE = 0.0005  # 0.05%
-
-# Tentar usar Volume Disk, se não existir usar local
-if os.path.exists('/opt/render/project/src/data'):
-    DB_DIR = '/opt/render/project/src/data'
-else:
-    DB_DIR = os.path.join(os.getcwd(), 'data')
-
-DB_PATH = os.path.join(DB_DIR, 'trading.db')
-SELF_PING_INTERVAL = 600  # 10 minutos
-TRADING_PAIR = "ETH/USDT"
-
 # Criar diretório se não existir
 os.makedirs(DB_DIR, exist_ok=True)
 print(f"[INFO] Database path: {DB_PATH}")
 print(f"[INFO] Directory exists: {os.path.exists(DB_DIR)}")
 
-class TradeSimulator:
-    def __init__(self):
-        self.init_database()
-        self.current_position = None
-        self.position_type = None  # 'LONG' ou 'SHORT'
-        self.load_state()
-    
-    def init_database(self):
-        """Inicializa o banco de dados SQLite"""
-        try:
-            print(f"[INIT_DB] Tentando conectar ao banco: {DB_PATH}")
-            conn = sqlite3.connect(DB_PATH, timeout=10.0)
-            cursor = conn.cursor()
-            
-            # Tabela de trades
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS trades (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    action TEXT NOT NULL,
-                    position_type TEXT NOT NULL,
-                    price REAL NOT NULL,
-                    quantity REAL NOT NULL,
-                    total_value REAL NOT NULL,
-                    commission REAL NOT NULL,
-                    balance_after REAL NOT NULL,
-                    profit_loss REAL DEFAULT 0,
-                    timestamp TEXT NOT NULL
-                )
-            ''')
-            
-            # Tabela de estado da conta
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS account_state (
-                    id INTEGER PRIMARY KEY CHECK (id = 1),
-                    balance REAL NOT NULL,
-                    position_open INTEGER DEFAULT 0,
-                    position_type TEXT,
-                    position_price REAL,
-                    position_quantity REAL,
-                    position_value REAL,
-                    total_profit REAL DEFAULT 0,
-                    peak_balance REAL NOT NULL,
-                    last_updated TEXT NOT NULL
-                )
-            ''')
-            
-            # Inicializa estado se não existir
-            cursor.execute('SELECT COUNT(*) FROM account_state')
-            if cursor.fetchone()[0] == 0:
-                print(f"[INIT_DB] Criando estado inicial com saldo ${INITIAL_BALANCE}")
-                cursor.execute('''
-                    INSERT INTO account_state 
-                    (id, balance, peak_balance, last_updated) 
-                    VALUES (1, ?, ?, ?)
-                ''', (INITIAL_BALANCE, INITIAL_BALANCE, datetime.now().isoformat()))
-            else:
-                # Verifica estado atual
-                cursor.execute('SELECT balance, position_open, position_type FROM account_state WHERE id = 1')
-                result = cursor.fetchone()
-                balance = result[0]
-                position_open = result[1]
-                position_type = result[2] if len(result) > 2 else None
-                print(f"[INIT_DB] Estado existente - Saldo: ${balance}, Posição: {position_type if position_open else 'Fechada'}")
-            
-            # Conta total de trades
-            cursor.execute('SELECT COUNT(*) FROM trades')
-            total_trades = cursor.fetchone()[0]
-            print(f"[INIT_DB] Total de trades no banco: {total_trades}")
-            
-            conn.commit()
-            conn.close()
-            print("[INIT_DB] Banco de dados inicializado com sucesso!")
-            
-        except Exception as e:
-            print(f"[INIT_DB] ERRO ao inicializar banco: {str(e)}")
-            import traceback
-            traceback.print_exc()
-    
-    def load_state(self):
-        """Carrega o estado atual da conta"""
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute('SELECT position_open, position_type, position_price, position_quantity, position_value FROM account_state WHERE id = 1')
-        state = cursor.fetchone()
-        conn.close()
-        
-        if state and state[0] == 1:  # position_open
-            self.current_position = {
-                'price': state[2],
-                'quantity': state[3],
-                'value': state[4]
-            }
-            self.position_type = state[1]
-            print(f"[LOAD_STATE] Posição {self.position_type} carregada - Preço: ${state[2]}")
-        else:
-            self.current_position = None
-            self.position_type = None
-    
-    def get_balance(self) -> float:
-        """Retorna o saldo atual"""
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute('SELECT balance FROM account_state WHERE id = 1')
-        balance = cursor.fetchone()[0]
-        conn.close()
-        return balance
-    
-    def update_peak_balance(self, current_balance: float):
-        """Atualiza o pico de saldo se necessário"""
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute('SELECT peak_balance FROM account_state WHERE id = 1')
-        peak = cursor.fetchone()[0]
-        
-        if current_balance > peak:
-            cursor.execute('UPDATE account_state SET peak_balance = ? WHERE id = 1', (current_balance,))
-            conn.commit()
-        conn.close()
-    
-    def open_long(self, price: float, timestamp: str) -> Dict:
-        """Abre uma posição LONG (compra) com 100% do saldo"""
-        if self.current_position:
-            return {'status': 'error', 'message': f'Já existe uma posição {self.position_type} aberta'}
-        
-        balance = self.get_balance()
-        commission = balance * COMMISSION_RATE
-        available_for_trade = balance - commission
-        quantity = available_for_trade / price
-        
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Registra o trade
-        cursor.execute('''
-            INSERT INTO trades 
-            (action, position_type, price, quantity, total_value, commission, balance_after, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', ('BUY', 'LONG', price, quantity, available_for_trade, commission, 0, timestamp))
-        
-        # Atualiza estado da conta
-        cursor.execute('''
-            UPDATE account_state 
-            SET position_open = 1,
-                position_type = 'LONG',
-                position_price = ?,
-                position_quantity = ?,
-                position_value = ?,
-                balance = 0,
-                last_updated = ?
-            WHERE id = 1
-        ''', (price, quantity, available_for_trade, timestamp))
-        
-        conn.commit()
-        conn.close()
-        
-        self.current_position = {
-            'price': price,
-            'quantity': quantity,
-            'value': available_for_trade
-        }
-        self.position_type = 'LONG'
-        
-        return {
-            'status': 'success',
-            'action': 'BUY',
-            'position_type': 'LONG',
-            'price': price,
-            'quantity': quantity,
-            'commission': commission,
-            'investment': available_for_trade
-        }
-    
-    def open_short(self, price: float, timestamp: str) -> Dict:
-        """Abre uma posição SHORT (venda a descoberto) com 100% do saldo"""
-        if self.current_position:
-            return {'status': 'error', 'message': f'Já existe uma posição {self.position_type} aberta'}
-        
-        balance = self.get_balance()
-        commission = balance * COMMISSION_RATE
-        available_for_trade = balance - commission
-        quantity = available_for_trade / price
-        
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Registra o trade
-        cursor.execute('''
-            INSERT INTO trades 
-            (action, position_type, price, quantity, total_value, commission, balance_after, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', ('SELL', 'SHORT', price, quantity, available_for_trade, commission, 0, timestamp))
-        
-        # Atualiza estado da conta
-        cursor.execute('''
-            UPDATE account_state 
-            SET position_open = 1,
-                position_type = 'SHORT',
-                position_price = ?,
-                position_quantity = ?,
-                position_value = ?,
-                balance = 0,
-                last_updated = ?
-            WHERE id = 1
-        ''', (price, quantity, available_for_trade, timestamp))
-        
-        conn.commit()
-        conn.close()
-        
-        self.current_position = {
-            'price': price,
-            'quantity': quantity,
-            'value': available_for_trade
-        }
-        self.position_type = 'SHORT'
-        
-        return {
-            'status': 'success',
-            'action': 'SELL',
-            'position_type': 'SHORT',
-            'price': price,
-            'quantity': quantity,
-            'commission': commission,
-            'investment': available_for_trade
-        }
-    
-    def close_long(self, price: float, timestamp: str) -> Dict:
-        """Fecha a posição LONG (vende)"""
-        if not self.current_position or self.position_type != 'LONG':
-            return {'status': 'error', 'message': 'Nenhuma posição LONG aberta'}
-        
-        # Salva dados da posição antes de limpar
-        position_quantity = self.current_position['quantity']
-        position_value = self.current_position['value']
-        entry_price = self.current_position['price']
-        
-        # Calcula o valor bruto da venda
-        gross_value = position_quantity * price
-        commission = gross_value * COMMISSION_RATE
-        net_value = gross_value - commission
-        
-        # Calcula lucro/prejuízo (LONG: ganho quando preço sobe)
-        profit_loss = net_value - position_value
-        
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Registra o trade de fechamento
-        cursor.execute('''
-            INSERT INTO trades 
-            (action, position_type, price, quantity, total_value, commission, balance_after, profit_loss, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', ('SELL', 'LONG', price, position_quantity, gross_value, commission, net_value, profit_loss, timestamp))
-        
-        # Atualiza estado da conta
-        cursor.execute('''
-            UPDATE account_state 
-            SET position_open = 0,
-                position_type = NULL,
-                position_price = NULL,
-                position_quantity = NULL,
-                position_value = NULL,
-                balance = ?,
-                total_profit = total_profit + ?,
-                last_updated = ?
-            WHERE id = 1
-        ''', (net_value, profit_loss, timestamp))
-        
-        conn.commit()
-        conn.close()
-        
-        self.update_peak_balance(net_value)
-        
-        # Prepara resultado antes de limpar a posição
-        result = {
-            'status': 'success',
-            'action': 'SELL',
-            'position_type': 'LONG',
-            'entry_price': entry_price,
-            'exit_price': price,
-            'quantity': position_quantity,
-            'gross_value': gross_value,
-            'commission': commission,
-            'net_value': net_value,
-            'profit_loss': profit_loss,
-            'profit_percentage': (profit_loss / position_value) * 100
-        }
-        
-        # Limpa a posição atual
-        self.current_position = None
-        self.position_type = None
-        
-        return result
-    
-    def close_short(self, price: float, timestamp: str) -> Dict:
-        """Fecha a posição SHORT (compra de volta)"""
-        if not self.current_position or self.position_type != 'SHORT':
-            return {'status': 'error', 'message': 'Nenhuma posição SHORT aberta'}
-        
-        # Salva dados da posição antes de limpar
-        position_quantity = self.current_position['quantity']
-        position_value = self.current_position['value']
-        entry_price = self.current_position['price']
-        
-        # Calcula o valor bruto da compra de volta
-        gross_value = position_quantity * price
-        commission = gross_value * COMMISSION_RATE
-        cost_to_close = gross_value + commission
-        
-        # Calcula lucro/prejuízo (SHORT: ganho quando preço cai)
-        profit_loss = position_value - cost_to_close
-        net_value = position_value + profit_loss
-        
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Registra o trade de fechamento
-        cursor.execute('''
-            INSERT INTO trades 
-            (action, position_type, price, quantity, total_value, commission, balance_after, profit_loss, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', ('BUY', 'SHORT', price, position_quantity, gross_value, commission, net_value, profit_loss, timestamp))
-        
-        # Atualiza estado da conta
-        cursor.execute('''
-            UPDATE account_state 
-            SET position_open = 0,
-                position_type = NULL,
-                position_price = NULL,
-                position_quantity = NULL,
-                position_value = NULL,
-                balance = ?,
-                total_profit = total_profit + ?,
-                last_updated = ?
-            WHERE id = 1
-        ''', (net_value, profit_loss, timestamp))
-        
-        conn.commit()
-        conn.close()
-        
-        self.update_peak_balance(net_value)
-        
-        # Prepara resultado antes de limpar a posição
-        result = {
-            'status': 'success',
-            'action': 'BUY',
-            'position_type': 'SHORT',
-            'entry_price': entry_price,
-            'exit_price': price,
-            'quantity': position_quantity,
-            'gross_value': gross_value,
-            'commission': commission,
-            'net_value': net_value,
-            'profit_loss': profit_loss,
-            'profit_percentage': (profit_loss / position_value) * 100
-        }
-        
-        # Limpa a posição atual
-        self.current_position = None
-        self.position_type = None
-        
-        return result
-    
-    def get_statistics(self) -> Dict:
-        """Retorna estatísticas do trading"""
-        try:
-            conn = sqlite3.connect(DB_PATH, timeout=10.0)
-            cursor = conn.cursor()
-            
-            # Total de LONGs abertos
-            cursor.execute('SELECT COUNT(*) FROM trades WHERE action = "BUY" AND position_type = "LONG"')
-            total_longs = cursor.fetchone()[0]
-            
-            # Total de SHORTs abertos
-            cursor.execute('SELECT COUNT(*) FROM trades WHERE action = "SELL" AND position_type = "SHORT"')
-            total_shorts = cursor.fetchone()[0]
-            
-            # Total de posições fechadas
-            cursor.execute('SELECT COUNT(*) FROM trades WHERE profit_loss != 0')
-            total_closed = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT total_profit FROM account_state WHERE id = 1')
-            result = cursor.fetchone()
-            total_profit = result[0] if result else 0
-            
-            cursor.execute('SELECT balance, peak_balance, position_open, position_type FROM account_state WHERE id = 1')
-            result = cursor.fetchone()
-            if result:
-                balance, peak, position_open, position_type = result
-            else:
-                balance, peak, position_open, position_type = INITIAL_BALANCE, INITIAL_BALANCE, 0, None
-            
-            # Calcula lucro/perda em porcentagem
-            profit_percentage = ((balance - INITIAL_BALANCE) / INITIAL_BALANCE) * 100
-            
-            # Calcula drawdown máximo
-            max_drawdown = 0
-            if peak > 0:
-                max_drawdown = ((peak - balance) / peak) * 100 if balance < peak else 0
-            
-            # Taxa de vitória (trades fechados com lucro)
-            cursor.execute('SELECT COUNT(*) FROM trades WHERE profit_loss > 0')
-            winning_trades = cursor.fetchone()[0]
-            
-            win_rate = (winning_trades / total_closed * 100) if total_closed > 0 else 0
-            
-            # Últimos 10 trades
-            cursor.execute('''
-                SELECT action, position_type, price, quantity, profit_loss, timestamp 
-                FROM trades 
-                ORDER BY id DESC 
-                LIMIT 10
-            ''')
-            recent_trades = cursor.fetchall()
-            
-            conn.close()
-            
-            stats = {
-                'total_longs': total_longs,
-                'total_shorts': total_shorts,
-                'total_closed': total_closed,
-                'total_profit_usd': round(total_profit, 2),
-                'total_profit_percentage': round(profit_percentage, 2),
-                'current_balance': round(balance, 2),
-                'initial_balance': INITIAL_BALANCE,
-                'max_drawdown': round(max_drawdown, 2),
-                'win_rate': round(win_rate, 2),
-                'recent_trades': recent_trades,
-                'position_open': position_open == 1,
-                'position_type': position_type
-            }
-            
-            print(f"[GET_STATISTICS] Longs={total_longs}, Shorts={total_shorts}, Fechados={total_closed}, Balance={balance}")
-            return stats
-            
-        except Exception as e:
-            print(f"[GET_STATISTICS] Erro: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            # Retorna valores padrão em caso de erro
-            return {
-                'total_longs': 0,
-                'total_shorts': 0,
-                'total_closed': 0,
-                'total_profit_usd': 0.0,
-                'total_profit_percentage': 0.0,
-                'current_balance': INITIAL_BALANCE,
-                'initial_balance': INITIAL_BALANCE,
-                'max_drawdown': 0.0,
-                'win_rate': 0.0,
-                'recent_trades': [],
-                'position_open': False,
-                'position_type': None
-            }
+rate_limiter = RateLimiter(RATE_LIMIT_DB_PATH) if RATE_LIMIT_ENABLED else None
+latency_tracker = LatencyTracker()
+
+@app.before_request
+def mark_received():
+    """Marca a chegada do sinal antes de rate limit e parse (ver latency.py)"""
+    if request.path == '/webhook':
+        g.received_at = request_received_at(request.headers, TRUST_REQUEST_START)
+
+@app.before_request
+def apply_rate_limit():
+    """Aplica os token buckets e descarta rotas de baixa prioridade sob carga"""
+    if rate_limiter is None:
+        return None
+    rejection = rate_limiter.admit(request.path, client_id(request))
+    if rejection:
+        retry_after, message = rejection
+        print(f"[RATE_LIMIT] {request.path} recusado para {client_id(request)}: {message}")
+        response = jsonify({'status': 'error', 'message': message, 'retry_after': retry_after})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+    g.rate_limit_admitted = True
+    return None
+
+@app.teardown_request
+def release_rate_limit(exc):
+    if g.pop('rate_limit_admitted', False):
+        rate_limiter.release()
 
 # Instância global do simulador
 simulator = TradeSimulator()
@@ -498,74 +71,37 @@ simulator = TradeSimulator()
 def webhook():
     """Endpoint para receber sinais do TradingView - SOMENTE executa quando recebe sinal"""
     try:
-        data = request.json
-        print(f"[WEBHOOK] Recebido: {data}")
-        
-        # Validação básica
-        if not data:
-            print("[WEBHOOK] Erro: Dados vazios")
-            return jsonify({'status': 'error', 'message': 'Dados vazios'}), 400
-        
-        # Extrai informações do sinal - com fallbacks
-        action = None
-        price = None
-        
-        # Tenta extrair action de diferentes formatos
-        if 'data' in data and isinstance(data['data'], dict):
-            action = data['data'].get('action', '').lower()
-        elif 'action' in data:
-            action = data['action'].lower()
-        
-        # Tenta extrair price de diferentes formatos
-        if 'price' in data:
-            try:
-                price = float(data['price'])
-            except (ValueError, TypeError):
-                price = None
-        
-        timestamp = data.get('time', datetime.now().isoformat())
+        if request.content_length is not None and request.content_length > MAX_WEBHOOK_BYTES:
+            return jsonify({'status': 'error', 'message': f'Payload maior que {MAX_WEBHOOK_BYTES} bytes'}), 413
+
+        try:
+            signal = parse_webhook(request.get_data(cache=False))
+        except SchemaError as e:
+            print(f"[WEBHOOK] Payload rejeitado: {e}")
+            return jsonify({'status': 'error', 'message': 'Payload inválido', 'errors': e.errors}), e.status
+
+        action = signal['action']
+        price = signal['price']
+        timestamp = signal.get('time') or datetime.now().isoformat()
+
+        received_at = g.get('received_at') or time.time()
+        signal_time = parse_signal_time(signal.get('time'))
+        timing = {
+            'received_at': received_at,
+            'signal_skew_ms': (received_at - signal_time) * 1000 if signal_time else None
+        }
         
         print(f"[WEBHOOK] Processando - Action: {action}, Price: {price}, Posição atual: {simulator.position_type}")
         
-        # Validação
-        if not action:
-            print("[WEBHOOK] Erro: Action não encontrado")
-            return jsonify({'status': 'error', 'message': 'Action não encontrado nos dados'}), 400
-        
-        if not price or price <= 0:
-            print("[WEBHOOK] Erro: Price inválido")
-            return jsonify({'status': 'error', 'message': 'Price inválido ou não encontrado'}), 400
-        
-        # Lógica de execução baseada no sinal e posição atual
-        result = None
-        
-        if action == 'buy':
-            if simulator.position_type == 'SHORT':
-                # BUY com SHORT aberto = Fecha SHORT
-                result = simulator.close_short(price, timestamp)
-                print(f"[TRADE] SHORT fechado - Preço: ${price}, Resultado: {result}")
-            elif not simulator.current_position:
-                # BUY sem posição = Abre LONG
-                result = simulator.open_long(price, timestamp)
-                print(f"[TRADE] LONG aberto - Preço: ${price}, Resultado: {result}")
-            else:
-                result = {'status': 'error', 'message': f'Já existe posição {simulator.position_type} aberta'}
-                
-        elif action == 'sell':
-            if simulator.position_type == 'LONG':
-                # SELL com LONG aberto = Fecha LONG
-                result = simulator.close_long(price, timestamp)
-                print(f"[TRADE] LONG fechado - Preço: ${price}, Resultado: {result}")
-            elif not simulator.current_position:
-                # SELL sem posição = Abre SHORT
-                result = simulator.open_short(price, timestamp)
-                print(f"[TRADE] SHORT aberto - Preço: ${price}, Resultado: {result}")
-            else:
-                result = {'status': 'error', 'message': f'Já existe posição {simulator.position_type} aberta'}
-        else:
-            print(f"[WEBHOOK] Erro: Ação desconhecida: {action}")
-            return jsonify({'status': 'error', 'message': f'Ação desconhecida: {action}'}), 400
-        
+        result = simulator.process_signal(action, price, timestamp, timing)
+        if 'trade_id' in timing:
+            # O fill já foi gravado: erro na métrica não pode virar 500
+            try:
+                latency = latency_tracker.record(timing, timing['trade_id'])
+                if latency['outlier_stages']:
+                    print(f"[LATENCY] Fill {timing['trade_id']} lento em {latency['outlier_stages']}: {latency['latency_ms']}")
+            except Exception as e:
+                print(f"[LATENCY] Erro ao registrar fill {timing['trade_id']}: {e}")
         return jsonify(result), 200
         
     except Exception as e:
@@ -589,17 +125,62 @@ def dashboard():
 def api_stats():
     """API para obter estatísticas em tempo real"""
     try:
-        stats = simulator.get_statistics()
-        print(f"[API STATS] Retornando: {stats}")
-        response = jsonify(stats)
-        response.headers['Content-Type'] = 'application/json'
-        return response
+        return jsonify(simulator.get_statistics())
     except Exception as e:
         print(f"[API STATS] Erro: {str(e)}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/trades/columns')
+def api_trades_columns():
+    """Exporta os trades em formato colunar binário (ver trade_export.py)"""
+    since_id = request.args.get('since_id', 0, type=int)
+    chunk_rows = request.args.get('chunk', 4096, type=int)
+    if since_id < 0 or chunk_rows <= 0:
+        return jsonify({'status': 'error', 'message': 'Parâmetros inválidos'}), 400
+
+    return Response(
+        iter_export(simulator.storage, since_id, chunk_rows),
+        mimetype='application/octet-stream',
+        headers={'Content-Disposition': 'attachment; filename=trades.bin'}
+    )
+
+@app.route('/api/risk')
+def api_risk():
+    """API de risco Monte Carlo sobre os retornos realizados (ver risk_engine.py)"""
+    paths = request.args.get('paths', DEFAULT_PATHS, type=int)
+    horizon = request.args.get('horizon', None, type=int)
+    ruin = request.args.get('ruin', DEFAULT_RUIN_FRACTION, type=float)
+    workers = request.args.get('workers', 1, type=int)
+    seed = request.args.get('seed', None, type=int)
+
+    if not 0 < paths <= 100000 or (horizon is not None and not 0 < horizon <= 10000):
+        return jsonify({'status': 'error', 'message': 'paths deve estar entre 1 e 100000 e horizon entre 1 e 10000'}), 400
+    if not 0 < ruin < 1 or not 1 <= workers <= (os.cpu_count() or 1):
+        return jsonify({'status': 'error', 'message': 'ruin deve estar entre 0 e 1 e workers entre 1 e o nº de CPUs'}), 400
+
+    if gevent_active() and workers > 1:
+        # O ProcessPoolExecutor não funciona a partir de uma thread do pool do gevent
+        # ("child watchers are only available on the default loop")
+        print(f"[API RISK] workers={workers} ignorado no worker gevent; usando 1 processo")
+        workers = 1
+
+    try:
+        report = run_blocking(get_risk_report, simulator.storage, paths, horizon, ruin, workers, seed)
+        status = 200 if report.get('status') == 'success' else 409
+        return jsonify(report), status
+    except Exception as e:
+        print(f"[API RISK] Erro: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/latency')
+def api_latency():
+    """Percentis de latência sinal -> fill por etapa, com outliers recentes"""
+    return jsonify(latency_tracker.snapshot())
+
 @app.route('/ping')
 def ping():
     """Endpoint de ping para manter o serviço ativo"""
@@ -633,9 +214,8 @@ def self_ping():
         
         time.sleep(SELF_PING_INTERVAL)
 
-# Inicia thread de auto-ping
-ping_thread = threading.Thread(target=self_ping, daemon=True)
-ping_thread.start()
+# Inicia o auto-ping (greenlet no worker gevent, thread daemon nos demais)
+ping_task = spawn_background(self_ping)
 
 if __name__ == '__main__':
     import os
@@ -0,0 +1,344 @@
+"""
+Armazenamento local de candles OHLCV em arquivo binário mapeado em memória
+
+Formato do arquivo `.ohlcv` (little-endian):
+
+    Cabeçalho (32 bytes)
+        magic         8s   b'OHLCV\\0\\0\\0'
+        version       u4
+        record_size   u4   (48)
+        n_records     u8
+        index_stride  u4   (um timestamp no índice a cada N candles)
+        reserved      u4
+
+    Registros de tamanho fixo, ordenados por timestamp:
+        timestamp i8 (epoch ms), open f8, high f8, low f8, close f8, volume f8
+
+O índice esparso fica no arquivo `.ohlcv.idx` (int64 com o timestamp de cada
+N-ésimo registro). Uma busca por intervalo faz searchsorted no índice e depois
+só dentro do bloco encontrado, então custa O(log n) e toca poucas páginas.
+As leituras retornam views NumPy sobre o memmap, sem carregar o arquivo inteiro.
+
+Uso:
+    python candle_store.py import precos.csv eth.ohlcv [--append]
+    python candle_store.py info eth.ohlcv
+    python candle_store.py replay eth.ohlcv --start 2024-01-01 --end 2024-02-01
+                                  [--speed 3600] [--db data/replay.db] [--storage memory]
+"""
+
+import argparse
+import csv
+import math
+import os
+import struct
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, Optional
+
+import numpy as np
+
+from config import DB_DIR
+
+MAGIC = b'OHLCV\0\0\0'
+FORMAT_VERSION = 1
+HEADER_STRUCT = struct.Struct('<8sIIQII')
+HEADER_SIZE = HEADER_STRUCT.size
+DEFAULT_INDEX_STRIDE = 1024
+
+CANDLE_DTYPE = np.dtype([
+    ('timestamp', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+
+TIMESTAMP_FIELDS = ('timestamp', 'time', 'date', 'datetime', 'open_time')
+
+
+def parse_timestamp(value) -> int:
+    """Converte epoch (s ou ms) ou data ISO em epoch ms (UTC se sem fuso)"""
+    value = str(value).strip()
+    try:
+        number = float(value)
+    except ValueError:
+        dt = datetime.fromisoformat(value)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return int(dt.timestamp() * 1000)
+    # Epochs em segundos têm no máximo 10 dígitos até o ano 2286
+    return int(number * 1000) if number < 1e11 else int(number)
+
+
+def format_timestamp(epoch_ms: int) -> str:
+    return datetime.fromtimestamp(epoch_ms / 1000, tz=timezone.utc).isoformat()
+
+
+def read_csv(csv_path: str) -> np.ndarray:
+    """Lê um CSV com cabeçalho (timestamp/time/date, open, high, low, close, volume)"""
+    with open(csv_path, newline='') as f:
+        reader = csv.DictReader(f)
+        fields = {name.strip().lower(): name for name in reader.fieldnames or []}
+        ts_field = next((fields[n] for n in TIMESTAMP_FIELDS if n in fields), None)
+        missing = [n for n in ('open', 'high', 'low', 'close') if n not in fields]
+        if ts_field is None or missing:
+            raise ValueError(f'CSV sem colunas obrigatórias: {missing or ["timestamp"]}')
+        volume_field = fields.get('volume')
+
+        rows = [
+            (parse_timestamp(row[ts_field]),
+             float(row[fields['open']]), float(row[fields['high']]),
+             float(row[fields['low']]), float(row[fields['close']]),
+             float(row[volume_field]) if volume_field and row[volume_field] else 0.0)
+            for row in reader
+        ]
+
+    candles = np.array(rows, dtype=CANDLE_DTYPE)
+    candles.sort(order='timestamp', kind='stable')
+    # Mantém a última ocorrência de timestamps duplicados
+    if len(candles) > 1:
+        keep = np.append(candles['timestamp'][1:] != candles['timestamp'][:-1], True)
+        candles = candles[keep]
+    return candles
+
+
+def _write_header(f, n_records: int, index_stride: int):
+    f.seek(0)
+    f.write(HEADER_STRUCT.pack(MAGIC, FORMAT_VERSION, CANDLE_DTYPE.itemsize,
+                               n_records, index_stride, 0))
+
+
+def _write_index(path: str, timestamps: np.ndarray, index_stride: int):
+    timestamps[::index_stride].astype('<i8').tofile(path + '.idx')
+
+
+def import_csv(csv_path: str, store_path: str, append: bool = False,
+               index_stride: int = DEFAULT_INDEX_STRIDE) -> Dict:
+    """Importa um CSV para o arquivo de candles; retorna quantos foram gravados
+
+    Com `append`, apenas candles posteriores ao último já gravado são adicionados.
+    """
+    candles = read_csv(csv_path)
+
+    if append and os.path.exists(store_path):
+        store = CandleStore(store_path)
+        last_ts = store.last_timestamp
+        index_stride = store.index_stride
+        n_existing = len(store)
+        store.close()
+        if last_ts is not None:
+            candles = candles[candles['timestamp'] > last_ts]
+        with open(store_path, 'r+b') as f:
+            f.seek(HEADER_SIZE + n_existing * CANDLE_DTYPE.itemsize)
+            candles.tofile(f)
+            _write_header(f, n_existing + len(candles), index_stride)
+    else:
+        n_existing = 0
+        with open(store_path, 'wb') as f:
+            _write_header(f, len(candles), index_stride)
+            candles.tofile(f)
+
+    # O índice é gravado antes de qualquer CandleStore abrir o arquivo, senão o
+    # construtor o acharia desatualizado e o reconstruiria à toa
+    total = n_existing + len(candles)
+    if n_existing:
+        records = np.memmap(store_path, dtype=CANDLE_DTYPE, mode='r',
+                            offset=HEADER_SIZE, shape=(total,))
+        _write_index(store_path, np.asarray(records['timestamp']), index_stride)
+        del records
+    else:
+        _write_index(store_path, candles['timestamp'], index_stride)
+    print(f"[CANDLES] {len(candles)} candles importados ({total} no total) em {store_path}")
+    return {'imported': len(candles), 'total': total}
+
+
+class CandleStore:
+    """Leitura mapeada em memória de um arquivo `.ohlcv`"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        magic, version, record_size, n_records, index_stride, _ = HEADER_STRUCT.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f'{path} não é um arquivo de candles')
+        if version != FORMAT_VERSION or record_size != CANDLE_DTYPE.itemsize:
+            raise ValueError(f'Versão de formato não suportada: {version}')
+
+        self.index_stride = index_stride
+        if n_records:
+            self.records = np.memmap(path, dtype=CANDLE_DTYPE, mode='r',
+                                     offset=HEADER_SIZE, shape=(n_records,))
+        else:
+            self.records = np.empty(0, dtype=CANDLE_DTYPE)
+
+        index_path = path + '.idx'
+        self.index = None
+        if os.path.exists(index_path):
+            index = np.fromfile(index_path, dtype='<i8')
+            # Um `.idx` de outra versão do arquivo (append interrompido, cópia
+            # parcial) quebraria as buscas em silêncio; confere tamanho e última entrada
+            expected = math.ceil(n_records / index_stride)
+            if len(index) == expected and (
+                    expected == 0 or index[-1] == self.records['timestamp'][(expected - 1) * index_stride]):
+                self.index = index
+            else:
+                print(f"[CANDLES] Índice desatualizado em {index_path}, reconstruindo")
+        if self.index is None:
+            self.index = np.asarray(self.records['timestamp'][::index_stride])
+            try:
+                _write_index(path, self.records['timestamp'], index_stride)
+            except OSError:
+                pass  # Somente leitura: usa o índice em memória
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def first_timestamp(self) -> Optional[int]:
+        return int(self.records[0]['timestamp']) if len(self) else None
+
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        return int(self.records[-1]['timestamp']) if len(self) else None
+
+    def _position(self, ts: int, side: str) -> int:
+        # Bloco pelo índice esparso, depois busca só dentro do bloco
+        block = max(0, int(np.searchsorted(self.index, ts, side=side)) - 1)
+        lo = block * self.index_stride
+        hi = min(len(self), lo + 2 * self.index_stride)
+        return lo + int(np.searchsorted(self.records['timestamp'][lo:hi], ts, side=side))
+
+    def range(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> np.ndarray:
+        """Candles com start_ms <= timestamp < end_ms como view do memmap"""
+        lo = 0 if start_ms is None else self._position(start_ms, 'left')
+        hi = len(self) if end_ms is None else self._position(end_ms, 'left')
+        return self.records[lo:max(lo, hi)]
+
+    def columns(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Mesmo que `range`, separado em views por coluna"""
+        candles = self.range(start_ms, end_ms)
+        return {name: candles[name] for name in CANDLE_DTYPE.names}
+
+    def close(self):
+        mmap = getattr(self.records, '_mmap', None)
+        self.records = np.empty(0, dtype=CANDLE_DTYPE)
+        if mmap is not None:
+            mmap.close()
+
+
+def sma_crossover_signals(closes: np.ndarray, fast: int = 9, slow: int = 21) -> np.ndarray:
+    """Sinais +1 (buy) / -1 (sell) / 0 quando a média rápida cruza a lenta"""
+    signals = np.zeros(len(closes), dtype=np.int8)
+    if len(closes) <= slow:
+        return signals
+    cumsum = np.concatenate(([0.0], np.cumsum(closes, dtype=np.float64)))
+    fast_ma = (cumsum[slow:] - cumsum[slow - fast:-fast]) / fast
+    slow_ma = (cumsum[slow:] - cumsum[:-slow]) / slow
+    above = fast_ma > slow_ma
+    cross = np.flatnonzero(above[1:] != above[:-1]) + 1
+    signals[cross + slow - 1] = np.where(above[cross], 1, -1)
+    return signals
+
+
+def iter_payloads(candles: np.ndarray, signals: np.ndarray,
+                  symbol: str = 'ETHUSDT') -> Iterator[Dict]:
+    """Converte candles com sinal em payloads no formato do signal_sender"""
+    for i in np.flatnonzero(signals):
+        candle = candles[i]
+        yield {
+            'data': {'action': 'buy' if signals[i] > 0 else 'sell', 'contracts': '1'},
+            'price': str(float(candle['close'])),
+            'symbol': symbol,
+            'time': format_timestamp(int(candle['timestamp']))
+        }
+
+
+def replay(store: CandleStore, simulator, start_ms: Optional[int] = None,
+           end_ms: Optional[int] = None, speed: float = 0,
+           strategy: Callable[[np.ndarray], np.ndarray] = sma_crossover_signals) -> Dict:
+    """Reenvia um intervalo como payloads de webhook para o simulador
+
+    `strategy` recebe os fechamentos e retorna um sinal por candle.
+    `speed` é quantos segundos de histórico passam por segundo real
+    (0 = o mais rápido possível).
+    """
+    from webhook_schema import validate_webhook
+
+    candles = store.range(start_ms, end_ms)
+    signals = strategy(np.asarray(candles['close']))
+    sent = 0
+    executed = 0
+    previous_ts = None
+    started = time.time()
+
+    for payload in iter_payloads(candles, signals):
+        signal = validate_webhook(payload)
+        ts = parse_timestamp(signal['time'])
+        if speed > 0 and previous_ts is not None:
+            time.sleep(max(0.0, (ts - previous_ts) / 1000 / speed))
+        previous_ts = ts
+
+        result = simulator.process_signal(signal['action'], signal['price'], signal['time'])
+        sent += 1
+        if result.get('status') == 'success':
+            executed += 1
+
+    return {
+        'candles': len(candles),
+        'signals_sent': sent,
+        'trades_executed': executed,
+        'elapsed_seconds': round(time.time() - started, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Armazenamento e replay de candles OHLCV')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_import = sub.add_parser('import', help='Importa um CSV')
+    p_import.add_argument('csv')
+    p_import.add_argument('store')
+    p_import.add_argument('--append', action='store_true', help='Adiciona ao arquivo existente')
+    p_import.add_argument('--stride', type=int, default=DEFAULT_INDEX_STRIDE, help='Candles por entrada do índice')
+
+    p_info = sub.add_parser('info', help='Mostra o intervalo armazenado')
+    p_info.add_argument('store')
+
+    p_replay = sub.add_parser('replay', help='Reenvia um intervalo para o simulador')
+    p_replay.add_argument('store')
+    p_replay.add_argument('--start', help='Início (ISO ou epoch)')
+    p_replay.add_argument('--end', help='Fim exclusivo (ISO ou epoch)')
+    p_replay.add_argument('--speed', type=float, default=0, help='Segundos de histórico por segundo (0 = máximo)')
+    p_replay.add_argument('--db', default=os.path.join(DB_DIR, 'replay.db'),
+                          help='Banco do simulador usado no replay (não use o banco de produção)')
+    p_replay.add_argument('--storage', choices=('sqlite', 'memory', 'hybrid'), default='sqlite',
+                          help='Backend do simulador (memory não grava nada em disco)')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        import_csv(args.csv, args.store, args.append, args.stride)
+    elif args.command == 'info':
+        store = CandleStore(args.store)
+        if len(store):
+            print(f"[CANDLES] {len(store)} candles de {format_timestamp(store.first_timestamp)} "
+                  f"a {format_timestamp(store.last_timestamp)}")
+        else:
+            print("[CANDLES] Arquivo vazio")
+    elif args.command == 'replay':
+        from storage import create_storage
+        from trade_simulator import TradeSimulator
+
+        os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+        store = CandleStore(args.store)
+        start = parse_timestamp(args.start) if args.start else None
+        end = parse_timestamp(args.end) if args.end else None
+        simulator = TradeSimulator(args.db, create_storage(args.storage, args.db))
+        result = replay(store, simulator, start, end, args.speed)
+        simulator.storage.close()
+        print(f"[REPLAY] {result}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Primitivas de concorrência que funcionam com workers sync e gevent
+
+Com o worker gevent do gunicorn (monkey patching ativo), as chamadas bloqueantes
+ao SQLite vão para um pool de threads nativas limitado, então o loop de eventos
+continua atendendo outras conexões enquanto o disco trabalha. Sem gevent, tudo
+roda direto na thread da requisição, como antes.
+"""
+
+import os
+import threading
+
+try:
+    import gevent
+    from gevent import monkey
+except ImportError:  # pragma: no cover - depende do ambiente
+    gevent = None
+    monkey = None
+
+SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', 4))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def gevent_active() -> bool:
+    """True quando o processo foi monkey-patched pelo gevent"""
+    return monkey is not None and monkey.is_module_patched('socket')
+
+
+def _threadpool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from gevent.threadpool import ThreadPool
+                _pool = ThreadPool(SQLITE_POOL_SIZE)
+    return _pool
+
+
+def run_blocking(fn, *args, **kwargs):
+    """Executa uma função bloqueante (I/O de SQLite) sem travar o loop de eventos"""
+    if gevent_active():
+        return _threadpool().apply(fn, args, kwargs)
+    return fn(*args, **kwargs)
+
+
+def make_lock():
+    """Lock que suspende só a greenlet que espera (gevent) ou a thread (sync)
+
+    O Semaphore do gevent acorda quem espera em ordem de chegada, preservando
+    a ordem dos fills.
+    """
+    if gevent_active():
+        from gevent.lock import Semaphore
+        return Semaphore(1)
+    return threading.Lock()
+
+
+def spawn_background(fn, *args):
+    """Inicia uma tarefa de fundo: greenlet no gevent, thread daemon sem ele"""
+    if gevent_active():
+        return gevent.spawn(fn, *args)
+    thread = threading.Thread(target=fn, args=args, daemon=True)
+    thread.start()
+    return thread
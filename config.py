@@ -0,0 +1,38 @@
+"""
+Configurações compartilhadas entre o app e os scripts de linha de comando
+"""
+
+import os
+
+INITIAL_BALANCE = 55.0  # Saldo inicial de $55 USDT
+COMMISSION_RATE = 0.0005  # 0.05%
+
+# Tentar usar Volume Disk, se não existir usar local
+if os.path.exists('/opt/render/project/src/data'):
+    DB_DIR = '/opt/render/project/src/data'
+else:
+    DB_DIR = os.path.join(os.getcwd(), 'data')
+
+DB_PATH = os.path.join(DB_DIR, 'trading.db')
+SELF_PING_INTERVAL = 600  # 10 minutos
+TRADING_PAIR = "ETH/USDT"
+
+# Rate limiting compartilhado entre workers (desative com RATE_LIMIT_ENABLED=0)
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') != '0'
+RATE_LIMIT_DB_PATH = os.path.join(DB_DIR, 'ratelimit.db')
+
+# Usa o X-Request-Start do proxy como instante de chegada (ver latency.py); só
+# ligue se o proxy sempre define o header, senão o cliente pode forjá-lo
+TRUST_REQUEST_START = os.environ.get('TRUST_REQUEST_START', '0') == '1'
+
+# Armazenamento do simulador: 'sqlite', 'memory' ou 'hybrid' (ver storage.py)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'sqlite')
+# No modo hybrid: máximo de fills que podem ser perdidos num crash e intervalo de checkpoint
+HYBRID_MAX_UNSAVED_FILLS = int(os.environ.get('HYBRID_MAX_UNSAVED_FILLS', 10))
+CHECKPOINT_INTERVAL = float(os.environ.get('CHECKPOINT_INTERVAL', 5.0))
+
+# Workers do gunicorn (mesma variável lida em gunicorn.conf.py)
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+if STORAGE_BACKEND == 'hybrid' and WEB_CONCURRENCY > 1:
+    # Cada worker teria sua cópia do estado e os ids dos trades colidiriam no checkpoint
+    raise RuntimeError('STORAGE_BACKEND=hybrid exige um único worker (WEB_CONCURRENCY=1)')
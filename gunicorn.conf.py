@@ -0,0 +1,16 @@
+"""
+Configuração do gunicorn
+
+Usa o worker cooperativo gevent por padrão: cada worker segura centenas de
+conexões ociosas (dashboards lentos, keep-alive) sem bloquear os sinais.
+Para voltar aos workers sync, defina GUNICORN_WORKER_CLASS=sync.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 500))
+timeout = 30
+keepalive = 5
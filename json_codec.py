@@ -0,0 +1,58 @@
+"""
+Codec JSON plugável: usa orjson quando instalado, senão o json da biblioteca padrão
+
+O mesmo codec é usado para ler o corpo do webhook e, via `install(app)`,
+para todas as respostas geradas por `jsonify`.
+"""
+
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
+
+CODEC_NAME = 'orjson' if orjson else 'json'
+
+
+if orjson:
+    def loads(data):
+        """Decodifica bytes ou str em objetos Python"""
+        return orjson.loads(data)
+
+    def dumps(obj, default=None) -> bytes:
+        """Codifica em JSON compacto (bytes UTF-8)"""
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def loads(data):
+        """Decodifica bytes ou str em objetos Python"""
+        return json.loads(data)
+
+    def dumps(obj, default=None) -> bytes:
+        """Codifica em JSON compacto (bytes UTF-8)"""
+        return json.dumps(obj, default=default, ensure_ascii=False,
+                          separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Provider do Flask que delega ao codec rápido"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return dumps(obj, default=self.default).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj, default=self.default),
+                                        mimetype=self.mimetype)
+
+
+def install(app):
+    """Troca o provider JSON do app se houver um codec mais rápido disponível"""
+    if orjson:
+        app.json = FastJSONProvider(app)
+    print(f"[JSON] Codec em uso: {CODEC_NAME}")
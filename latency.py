@@ -0,0 +1,212 @@
+"""
+Rastreamento de latência sinal -> fill com histogramas em memória
+
+Etapas medidas por fill (em ms):
+    network     recebido - `time` do payload (skew de envio; inclui diferença de relógio)
+    queue       início do processamento - recebido (fila do gunicorn, rate limit, parse, lock)
+    processing  gravação do fill - início do processamento (cálculo e escritas no SQLite)
+    total       gravação do fill - recebido
+
+Cada etapa usa histogramas com buckets logarítmicos em janelas de tempo
+rotativas, então percentis custam O(buckets) e nunca varrem a tabela `trades`.
+Valores negativos (no `network`, relógio do remetente adiantado) não cabem na
+escala logarítmica e são contados à parte, com o mais negativo da janela.
+O estado é por processo.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+STAGES = ('network', 'queue', 'processing', 'total')
+
+WINDOW_SECONDS = 300  # 5 minutos por janela
+WINDOW_COUNT = 12  # 1 hora de histórico rotativo
+MIN_LATENCY_MS = 0.01
+BUCKETS_PER_DECADE = 20  # ~12% de largura por bucket
+DECADES = 8  # 0,01 ms .. 1.000.000 ms
+N_BUCKETS = BUCKETS_PER_DECADE * DECADES + 2  # + underflow (<= mínimo) e overflow
+OUTLIER_MIN_MS = 250.0  # Abaixo disso nada é considerado outlier
+OUTLIER_MIN_SAMPLES = 20
+MAX_OUTLIERS = 50
+# Janela aceita para o X-Request-Start em relação ao relógio local (s)
+REQUEST_START_MAX_AGE = 60.0
+REQUEST_START_MAX_AHEAD = 1.0  # Diferença de relógio entre proxy e app
+
+
+def parse_signal_time(value) -> Optional[float]:
+    """Converte o `time` do payload (ISO ou epoch s/ms) em epoch segundos"""
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        pass
+    else:
+        # "nan"/"inf" viram float sem erro, mas não são instantes
+        if not math.isfinite(number):
+            return None
+        return number / 1000 if number > 1e11 else number
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return None
+
+
+def request_received_at(headers, trust_header: bool = False) -> float:
+    """Instante de chegada: X-Request-Start do proxy, se habilitado e plausível, senão agora
+
+    O header vem do cliente se nenhum proxy o sobrescrever, então só é usado com
+    `trust_header` e dentro de REQUEST_START_MAX_AGE segundos antes de agora.
+    """
+    now = time.time()
+    start = headers.get('X-Request-Start', '') if trust_header else ''
+    if start:
+        try:
+            value = float(start.split('=')[-1])
+            if math.isfinite(value):
+                # O header pode vir em s, ms ou µs
+                while value > 1e11:
+                    value /= 1000
+                if now - REQUEST_START_MAX_AGE <= value <= now + REQUEST_START_MAX_AHEAD:
+                    return min(value, now)
+        except ValueError:
+            pass
+    return now
+
+
+def _bucket(value_ms: float) -> int:
+    if value_ms <= MIN_LATENCY_MS:
+        return 0
+    index = int(math.log10(value_ms / MIN_LATENCY_MS) * BUCKETS_PER_DECADE) + 1
+    return min(index, N_BUCKETS - 1)
+
+
+def _bucket_upper_ms(index: int) -> float:
+    if index == 0:
+        return MIN_LATENCY_MS
+    return MIN_LATENCY_MS * 10 ** (index / BUCKETS_PER_DECADE)
+
+
+class LatencyTracker:
+    def __init__(self, window_seconds: int = WINDOW_SECONDS, window_count: int = WINDOW_COUNT):
+        self.window_seconds = window_seconds
+        self.window_count = window_count
+        self.lock = threading.Lock()
+        # Por etapa: janela -> contagens por bucket
+        self.windows = {stage: {} for stage in STAGES}
+        self.maxima = {stage: {} for stage in STAGES}
+        # Por etapa: janela -> [nº de valores negativos, menor valor]
+        self.negatives = {stage: {} for stage in STAGES}
+        self.outliers = deque(maxlen=MAX_OUTLIERS)
+
+    def _window(self, now: float) -> int:
+        return int(now // self.window_seconds)
+
+    def _expire(self, current: int):
+        oldest = current - self.window_count + 1
+        for stage in STAGES:
+            for window in [w for w in self.windows[stage] if w < oldest]:
+                del self.windows[stage][window]
+                self.maxima[stage].pop(window, None)
+            for window in [w for w in self.negatives[stage] if w < oldest]:
+                del self.negatives[stage][window]
+
+    def _merged(self, stage: str) -> List[int]:
+        merged = [0] * N_BUCKETS
+        for counts in self.windows[stage].values():
+            for i, c in enumerate(counts):
+                merged[i] += c
+        return merged
+
+    @staticmethod
+    def _percentile(merged: List[int], total: int, pct: float) -> float:
+        target = max(1, math.ceil(total * pct / 100))
+        running = 0
+        for i, c in enumerate(merged):
+            running += c
+            if running >= target:
+                return _bucket_upper_ms(i)
+        return _bucket_upper_ms(N_BUCKETS - 1)
+
+    def record(self, timing: Dict, trade_id: Optional[int] = None, now: Optional[float] = None) -> Dict:
+        """Registra um fill; retorna as etapas em ms e se foi outlier"""
+        now = time.time() if now is None else now
+        received = timing.get('received_at')
+        started = timing.get('processing_started_at')
+        committed = timing.get('committed_at')
+        stages = {
+            'network': timing.get('signal_skew_ms'),
+            'queue': (started - received) * 1000 if received and started else None,
+            'processing': (committed - started) * 1000 if started and committed else None,
+            'total': (committed - received) * 1000 if received and committed else None,
+        }
+
+        window = self._window(now)
+        flagged = []
+        with self.lock:
+            self._expire(window)
+            for stage, value in stages.items():
+                if value is None or not math.isfinite(value):
+                    continue
+                if value < 0:
+                    negative = self.negatives[stage].setdefault(window, [0, value])
+                    negative[0] += 1
+                    negative[1] = min(negative[1], value)
+                    continue
+                merged = self._merged(stage)
+                total = sum(merged)
+                # Outlier: acima do p99 atual (com amostras suficientes) e do piso absoluto
+                if (stage != 'network' and total >= OUTLIER_MIN_SAMPLES and value >= OUTLIER_MIN_MS
+                        and value > self._percentile(merged, total, 99)):
+                    flagged.append(stage)
+
+                counts = self.windows[stage].setdefault(window, [0] * N_BUCKETS)
+                counts[_bucket(value)] += 1
+                self.maxima[stage][window] = max(self.maxima[stage].get(window, value), value)
+
+            if flagged:
+                self.outliers.append({
+                    'trade_id': trade_id,
+                    'at': datetime.fromtimestamp(now).isoformat(),
+                    'stages': flagged,
+                    'latency_ms': {k: round(v, 3) for k, v in stages.items() if v is not None}
+                })
+
+        stages = {k: v for k, v in stages.items() if v is not None and math.isfinite(v)}
+        return {'latency_ms': stages, 'outlier_stages': flagged}
+
+    def snapshot(self, now: Optional[float] = None) -> Dict:
+        """Percentis por etapa sobre as janelas ativas"""
+        now = time.time() if now is None else now
+        with self.lock:
+            self._expire(self._window(now))
+            result = {}
+            for stage in STAGES:
+                merged = self._merged(stage)
+                total = sum(merged)
+                result[stage] = {'count': total}
+                negatives = self.negatives[stage].values()
+                if negatives:
+                    result[stage]['negative'] = {
+                        'count': sum(n[0] for n in negatives),
+                        'min': round(min(n[1] for n in negatives), 3)
+                    }
+                if total == 0:
+                    continue
+                # O limite superior do bucket pode passar do máximo observado
+                maximum = max(self.maxima[stage].values())
+                for pct in (50, 90, 99):
+                    result[stage][f'p{pct}'] = round(min(self._percentile(merged, total, pct), maximum), 3)
+                result[stage]['max'] = round(maximum, 3)
+            outliers = list(self.outliers)
+
+        return {
+            'window_minutes': self.window_seconds * self.window_count // 60,
+            'unit': 'ms',
+            'stages': result,
+            'outliers': outliers
+        }
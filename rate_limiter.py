@@ -0,0 +1,187 @@
+"""
+Rate limiting por cliente e por rota com descarte de carga (load shedding)
+
+Cada requisição consome um token de dois token buckets: um do cliente naquela
+rota e um global da rota. O estado fica em um arquivo SQLite (WAL) para ser
+compartilhado entre os workers do gunicorn.
+
+Rotas de baixa prioridade (/api/stats, /ping, ...) também são descartadas
+quando o worker já tem requisições demais em andamento, para que os sinais do
+/webhook não esperem atrás de dashboards. Em ambos os casos a resposta é 429
+com Retry-After.
+"""
+
+import math
+import sqlite3
+import threading
+import time
+from collections import deque, namedtuple
+from typing import Dict, Optional, Tuple
+
+from concurrency import run_blocking
+
+HIGH_PRIORITY = 0
+LOW_PRIORITY = 1
+
+# Taxas em tokens por segundo; burst é a capacidade do bucket
+RouteLimit = namedtuple('RouteLimit', 'priority client_rate client_burst route_rate route_burst')
+
+ROUTE_LIMITS = {
+    '/webhook': RouteLimit(HIGH_PRIORITY, 0.5, 10, 5.0, 20),
+    '/api/stats': RouteLimit(LOW_PRIORITY, 1.0, 5, 20.0, 40),
+    '/ping': RouteLimit(LOW_PRIORITY, 0.2, 5, 2.0, 10),
+    '/api/risk': RouteLimit(LOW_PRIORITY, 0.2, 2, 1.0, 4),
+    '/api/trades/columns': RouteLimit(LOW_PRIORITY, 0.2, 2, 1.0, 4),
+    '/api/latency': RouteLimit(LOW_PRIORITY, 1.0, 5, 10.0, 20),
+}
+
+# Requisições simultâneas neste worker a partir das quais a baixa prioridade é descartada
+SHED_INFLIGHT_THRESHOLD = 4
+SHED_RETRY_AFTER = 1
+# Intervalo entre limpezas de buckets parados (já cheios de novo)
+PRUNE_INTERVAL = 60.0
+
+
+class RateLimiter:
+    def __init__(self, db_path: str, limits: Dict[str, RouteLimit] = ROUTE_LIMITS,
+                 shed_threshold: int = SHED_INFLIGHT_THRESHOLD):
+        self.db_path = db_path
+        self.limits = limits
+        self.shed_threshold = shed_threshold
+        # Conexões ociosas; deque.pop/append são atômicos entre threads nativas
+        self._idle = deque()
+        self._inflight_lock = threading.Lock()
+        self.in_flight = 0
+        # Um bucket parado por mais que burst/rate está cheio e equivale a não existir
+        self.bucket_ttl = max(max(l.client_burst / l.client_rate, l.route_burst / l.route_rate)
+                              for l in limits.values()) if limits else 0.0
+        self._next_prune = 0.0
+        self.init_database()
+
+    def init_database(self):
+        """Cria a tabela de buckets compartilhada"""
+        conn = self._acquire()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+            ''')
+        finally:
+            self._release(conn)
+
+    def _acquire(self) -> sqlite3.Connection:
+        # Pega uma conexão ociosa ou abre outra; o total fica limitado ao nº de
+        # chamadas simultâneas (o pool de threads do SQLite, no gevent).
+        # Não dá para usar threading.local: com monkey patching ele vira local
+        # por greenlet e cada requisição abriria uma conexão nova
+        try:
+            return self._idle.pop()
+        except IndexError:
+            conn = sqlite3.connect(self.db_path, timeout=1.0, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA synchronous=OFF')
+            return conn
+
+    def _release(self, conn: sqlite3.Connection):
+        self._idle.append(conn)
+
+    def close(self):
+        """Fecha as conexões ociosas"""
+        while self._idle:
+            self._idle.pop().close()
+
+    def take_tokens(self, buckets: Tuple[Tuple[str, float, int], ...],
+                    now: Optional[float] = None) -> float:
+        """Consome um token de cada bucket (key, rate, burst) atomicamente
+
+        Retorna 0 se a requisição foi aceita, senão os segundos até haver token.
+        """
+        now = time.time() if now is None else now
+        conn = self._acquire()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                updates = []
+                wait = 0.0
+                for key, rate, burst in buckets:
+                    row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                    if row:
+                        tokens = min(burst, row[0] + max(0.0, now - row[1]) * rate)
+                    else:
+                        tokens = float(burst)
+                    if tokens < 1.0:
+                        wait = max(wait, (1.0 - tokens) / rate)
+                    updates.append((key, tokens - 1.0, now))
+
+                if wait > 0:
+                    conn.execute('ROLLBACK')
+                    return wait
+
+                conn.executemany('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)', updates)
+                if now >= self._next_prune:
+                    self._next_prune = now + PRUNE_INTERVAL
+                    conn.execute('DELETE FROM buckets WHERE updated < ?', (now - self.bucket_ttl,))
+                conn.execute('COMMIT')
+                return 0.0
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            self._release(conn)
+
+    def admit(self, route: str, client: str) -> Optional[Tuple[int, str]]:
+        """Decide se a requisição entra; retorna None ou (retry_after, motivo)
+
+        Requisições aceitas devem chamar `release` ao terminar.
+        """
+        limit = self.limits.get(route)
+
+        with self._inflight_lock:
+            if limit and limit.priority == LOW_PRIORITY and self.in_flight >= self.shed_threshold:
+                return SHED_RETRY_AFTER, 'Servidor sobrecarregado'
+            self.in_flight += 1
+
+        if limit is None:
+            return None
+
+        try:
+            # BEGIN IMMEDIATE pode esperar pelo lock do arquivo; fora do loop de eventos
+            wait = run_blocking(self.take_tokens, (
+                (f'{route}|{client}', limit.client_rate, limit.client_burst),
+                (route, limit.route_rate, limit.route_burst),
+            ))
+        except sqlite3.Error as e:
+            # Falha no limitador não pode derrubar os sinais
+            print(f"[RATE_LIMIT] Erro no estado compartilhado, liberando requisição: {e}")
+            wait = 0.0
+        except BaseException:
+            # O chamador só libera o slot de requisições aceitas; aqui ele vazaria
+            self.release()
+            raise
+
+        if wait > 0:
+            self.release()
+            return max(1, math.ceil(wait)), 'Limite de requisições excedido'
+        return None
+
+    def release(self):
+        with self._inflight_lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+
+def client_id(request) -> str:
+    """Identifica o cliente pelo último IP do X-Forwarded-For
+
+    Só a entrada mais à direita é anexada pelo proxy do Render; as anteriores
+    vêm do próprio cliente e podem ser forjadas para escapar do limite.
+    """
+    forwarded = request.headers.get('X-Forwarded-For', '')
+    if forwarded:
+        last = forwarded.split(',')[-1].strip()
+        if last:
+            return last
+    return request.remote_addr or 'unknown'
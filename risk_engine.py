@@ -0,0 +1,204 @@
+"""
+Motor de risco Monte Carlo sobre a distribuição realizada dos trades
+
+Reamostra (bootstrap) os retornos por trade já realizados
+(`profit_loss / total_value` dos trades de fechamento) em milhares de caminhos
+simulados, partindo de INITIAL_BALANCE. Como o bot opera sempre com 100% do
+saldo, cada caminho é o produto acumulado de (1 + retorno).
+
+Uso:
+    python risk_engine.py [--db data/trading.db] [--paths 10000] [--horizon N]
+                          [--workers 4] [--ruin 0.5] [--seed 42]
+"""
+
+import argparse
+import contextlib
+import json
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from config import DB_PATH, INITIAL_BALANCE
+from storage import SQLiteStorage, TradeStorage
+
+DEFAULT_PATHS = 5000
+DEFAULT_RUIN_FRACTION = 0.5  # Ruína = perder metade do saldo inicial
+# Orçamento de memória por lote: cada lote usa ~3 matrizes lote x horizonte de 8 bytes
+# (índices sorteados, patrimônio e pico), então o nº de caminhos por lote sai daqui
+BATCH_BYTES = 64 * 1024 * 1024
+BATCH_MATRICES = 3
+PERCENTILES = (5, 25, 50, 75, 95)
+# Relatórios guardados para o último fill; cada combinação de parâmetros é uma entrada
+CACHE_SIZE = 16
+
+_cache: 'OrderedDict[Tuple, Dict]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def load_trade_returns(storage: TradeStorage) -> Tuple[np.ndarray, int]:
+    """Retorna (retornos por trade fechado, id do último trade)"""
+    rows, last_id = storage.closed_trades()
+    if not rows:
+        return np.empty(0, dtype=np.float64), last_id
+    data = np.asarray(rows, dtype=np.float64)
+    return data[:, 0] / data[:, 1], last_id
+
+
+def simulate_paths(returns: np.ndarray, n_paths: int, horizon: int,
+                   initial_balance: float, ruin_balance: float,
+                   seed) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Simula `n_paths` caminhos de `horizon` trades
+
+    Retorna (saldo final, drawdown máximo em fração, flag de ruína) por caminho.
+    """
+    rng = np.random.default_rng(seed)
+    final = np.empty(n_paths)
+    max_dd = np.empty(n_paths)
+    ruined = np.empty(n_paths, dtype=bool)
+
+    batch_paths = max(1, BATCH_BYTES // (horizon * 8 * BATCH_MATRICES))
+    for start in range(0, n_paths, batch_paths):
+        stop = min(start + batch_paths, n_paths)
+        equity = rng.choice(returns, size=(stop - start, horizon))
+        # Operações in-place para não criar temporários do tamanho do lote
+        # Retornos abaixo de -100% não fazem sentido com saldo não negativo
+        equity += 1.0
+        np.maximum(equity, 0.0, out=equity)
+        np.cumprod(equity, axis=1, out=equity)
+        equity *= initial_balance
+
+        final[start:stop] = equity[:, -1]
+        ruined[start:stop] = equity.min(axis=1) <= ruin_balance
+
+        peak = np.maximum.accumulate(equity, axis=1)
+        np.maximum(peak, initial_balance, out=peak)
+        np.divide(equity, peak, out=peak)
+        max_dd[start:stop] = 1.0 - peak.min(axis=1)
+        del equity, peak
+
+    return final, max_dd, ruined
+
+
+def _simulate_chunk(args):
+    return simulate_paths(*args)
+
+
+def _distribution(values: np.ndarray, scale: float = 1.0) -> Dict:
+    pcts = np.percentile(values, PERCENTILES) * scale
+    result = {f'p{p}': round(float(v), 4) for p, v in zip(PERCENTILES, pcts)}
+    result['mean'] = round(float(values.mean() * scale), 4)
+    result['min'] = round(float(values.min() * scale), 4)
+    result['max'] = round(float(values.max() * scale), 4)
+    return result
+
+
+def run_monte_carlo(returns: np.ndarray, n_paths: int = DEFAULT_PATHS,
+                    horizon: Optional[int] = None,
+                    initial_balance: float = INITIAL_BALANCE,
+                    ruin_fraction: float = DEFAULT_RUIN_FRACTION,
+                    workers: int = 1, seed: Optional[int] = None) -> Dict:
+    """Executa a simulação, opcionalmente dividida entre processos"""
+    horizon = horizon or len(returns)
+    if len(returns) == 0 or horizon <= 0:
+        return {
+            'status': 'error',
+            'message': 'Nenhum trade fechado para reamostrar'
+        }
+
+    ruin_balance = initial_balance * ruin_fraction
+    n_chunks = max(1, min(workers, n_paths))
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    sizes = [n_paths // n_chunks + (1 if i < n_paths % n_chunks else 0) for i in range(n_chunks)]
+    tasks = [(returns, size, horizon, initial_balance, ruin_balance, s)
+             for size, s in zip(sizes, seeds)]
+
+    if n_chunks > 1:
+        with ProcessPoolExecutor(max_workers=n_chunks) as pool:
+            parts = list(pool.map(_simulate_chunk, tasks))
+    else:
+        parts = [_simulate_chunk(tasks[0])]
+
+    final = np.concatenate([p[0] for p in parts])
+    max_dd = np.concatenate([p[1] for p in parts])
+    ruined = np.concatenate([p[2] for p in parts])
+
+    return {
+        'status': 'success',
+        'paths': n_paths,
+        'workers': n_chunks,
+        'horizon_trades': horizon,
+        'sample_size': int(len(returns)),
+        'initial_balance': initial_balance,
+        'ruin_balance': round(ruin_balance, 2),
+        'final_balance': _distribution(final),
+        'max_drawdown': _distribution(max_dd, 100.0),
+        'risk_of_ruin': round(float(ruined.mean() * 100), 2),
+        'probability_of_loss': round(float((final < initial_balance).mean() * 100), 2)
+    }
+
+
+def get_risk_report(storage: TradeStorage, n_paths: int = DEFAULT_PATHS,
+                    horizon: Optional[int] = None,
+                    ruin_fraction: float = DEFAULT_RUIN_FRACTION,
+                    workers: int = 1, seed: Optional[int] = None) -> Dict:
+    """Relatório de risco com cache válido até o próximo fill
+
+    Lê do backend do simulador, então no modo memory/hybrid os fills ainda sem
+    checkpoint também entram.
+    """
+    # Só o último id decide se o cache vale; os retornos só são lidos num miss.
+    # `workers` entra na chave porque a divisão em lotes muda os caminhos da mesma semente
+    last_id = storage.last_trade_id()
+    key = (storage, last_id, n_paths, horizon, ruin_fraction, workers, seed)
+
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+    if cached is not None:
+        return cached
+
+    returns, last_id = load_trade_returns(storage)
+    # Um fill pode ter chegado entre as duas leituras
+    key = (storage, last_id) + key[2:]
+    report = run_monte_carlo(returns, n_paths, horizon, INITIAL_BALANCE,
+                             ruin_fraction, workers, seed)
+    report['last_trade_id'] = last_id
+
+    with _cache_lock:
+        # Entradas de fills anteriores nunca mais serão usadas
+        for old_key in [k for k in _cache if k[1] != last_id]:
+            del _cache[old_key]
+        _cache[key] = report
+        # LRU: parâmetros variados (seed, paths...) não podem crescer o cache sem limite
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulação Monte Carlo de risco dos trades realizados')
+    parser.add_argument('--db', default=DB_PATH, help='Caminho do banco SQLite')
+    parser.add_argument('--paths', type=int, default=DEFAULT_PATHS, help='Número de caminhos simulados')
+    parser.add_argument('--horizon', type=int, default=None, help='Trades por caminho (padrão: nº de trades realizados)')
+    parser.add_argument('--workers', type=int, default=1, help='Processos para dividir a simulação')
+    parser.add_argument('--ruin', type=float, default=DEFAULT_RUIN_FRACTION, help='Fração do saldo inicial que define ruína')
+    parser.add_argument('--seed', type=int, default=None, help='Semente para resultados reprodutíveis')
+    args = parser.parse_args()
+
+    # Os logs de abertura do banco não podem se misturar ao JSON no stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        storage = SQLiteStorage(args.db)
+    returns, last_id = load_trade_returns(storage)
+    report = run_monte_carlo(returns, args.paths, args.horizon, INITIAL_BALANCE,
+                             args.ruin, args.workers, args.seed)
+    report['last_trade_id'] = last_id
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,534 @@
+"""
+Backends de armazenamento do TradeSimulator
+
+    sqlite  - cada fill é gravado no arquivo SQLite (comportamento original)
+    memory  - tudo em memória, trades em arrays compactos; para simulações e testes
+    hybrid  - serve da memória e faz checkpoint assíncrono no arquivo SQLite.
+              `max_unsaved_fills` limita quantos fills podem ser perdidos num crash
+              (0 = grava a cada fill, como o sqlite).
+
+O modo hybrid mantém o estado no processo, então só roda com um único worker
+(config.py recusa STORAGE_BACKEND=hybrid com WEB_CONCURRENCY > 1).
+"""
+
+import atexit
+import bisect
+import math
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from datetime import datetime
+from typing import Dict, Iterator, List, Tuple
+
+from concurrency import run_blocking, spawn_background
+from config import INITIAL_BALANCE
+
+ACCOUNT_COLUMNS = (
+    'balance', 'position_open', 'position_type', 'position_price',
+    'position_quantity', 'position_value', 'total_profit', 'peak_balance', 'last_updated'
+)
+# Tempos do fill em epoch segundos; skew em ms (ver latency.py)
+TIMING_COLUMNS = ('received_at', 'processing_started_at', 'committed_at', 'signal_skew_ms')
+TRADE_COLUMNS = (
+    'id', 'action', 'position_type', 'price', 'quantity', 'total_value',
+    'commission', 'balance_after', 'profit_loss', 'timestamp'
+) + TIMING_COLUMNS
+TRADE_FLOAT_COLUMNS = ('price', 'quantity', 'total_value', 'commission', 'balance_after', 'profit_loss')
+
+
+def initial_account() -> Dict:
+    return {
+        'balance': INITIAL_BALANCE,
+        'position_open': 0,
+        'position_type': None,
+        'position_price': None,
+        'position_quantity': None,
+        'position_value': None,
+        'total_profit': 0.0,
+        'peak_balance': INITIAL_BALANCE,
+        'last_updated': datetime.now().isoformat()
+    }
+
+
+class TradeStorage(ABC):
+    """Interface: estado da conta, inclusão de trades e consultas de estatísticas"""
+
+    @abstractmethod
+    def load_account(self) -> Dict:
+        """Retorna o estado da conta com as chaves de ACCOUNT_COLUMNS"""
+
+    @abstractmethod
+    def record_fill(self, trade: Dict, account_changes: Dict) -> int:
+        """Grava o trade e as mudanças na conta atomicamente; retorna o id do trade
+
+        Preenche `trade['committed_at']` com o instante em que as escritas do
+        fill terminaram (no SQLite, logo antes do COMMIT) e persiste esse valor.
+        """
+
+    @abstractmethod
+    def trade_counts(self) -> Dict:
+        """Contagens: total_longs, total_shorts, total_closed, winning_trades"""
+
+    @abstractmethod
+    def recent_trades(self, limit: int = 10) -> List[Tuple]:
+        """(action, position_type, price, quantity, profit_loss, timestamp), mais recente primeiro"""
+
+    @abstractmethod
+    def last_trade_id(self) -> int:
+        """Id do último trade (0 se não houver); muda a cada fill"""
+
+    @abstractmethod
+    def trade_id_range(self, since_id: int = 0) -> Tuple[int, int, int]:
+        """(nº de trades, primeiro id, último id) dos trades com id > since_id
+
+        Sem trades, o primeiro id é 0 e o último é `since_id`.
+        """
+
+    @abstractmethod
+    def trade_column(self, name: str, after_id: int, last_id: int, limit: int) -> List[Tuple]:
+        """Até `limit` pares (id, valor) da coluna com after_id < id <= last_id, por id"""
+
+    @abstractmethod
+    def closed_trades(self) -> Tuple[List[Tuple[float, float]], int]:
+        """((profit_loss, total_value) dos trades de fechamento por id, último id)"""
+
+    def close(self):
+        pass
+
+
+class SQLiteStorage(TradeStorage):
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.init_database()
+
+    def init_database(self):
+        """Inicializa o banco de dados SQLite"""
+        try:
+            print(f"[INIT_DB] Tentando conectar ao banco: {self.db_path}")
+            conn = sqlite3.connect(self.db_path, timeout=10.0)
+            cursor = conn.cursor()
+
+            # Tabela de trades
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS trades (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    action TEXT NOT NULL,
+                    position_type TEXT NOT NULL,
+                    price REAL NOT NULL,
+                    quantity REAL NOT NULL,
+                    total_value REAL NOT NULL,
+                    commission REAL NOT NULL,
+                    balance_after REAL NOT NULL,
+                    profit_loss REAL DEFAULT 0,
+                    timestamp TEXT NOT NULL,
+                    received_at REAL,
+                    processing_started_at REAL,
+                    committed_at REAL,
+                    signal_skew_ms REAL
+                )
+            ''')
+
+            # Migra bancos criados antes das colunas de latência
+            cursor.execute('PRAGMA table_info(trades)')
+            existing = {row[1] for row in cursor.fetchall()}
+            for column in TIMING_COLUMNS:
+                if column not in existing:
+                    print(f"[INIT_DB] Adicionando coluna {column} em trades")
+                    cursor.execute(f'ALTER TABLE trades ADD COLUMN {column} REAL')
+
+            # Tabela de estado da conta
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS account_state (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    balance REAL NOT NULL,
+                    position_open INTEGER DEFAULT 0,
+                    position_type TEXT,
+                    position_price REAL,
+                    position_quantity REAL,
+                    position_value REAL,
+                    total_profit REAL DEFAULT 0,
+                    peak_balance REAL NOT NULL,
+                    last_updated TEXT NOT NULL
+                )
+            ''')
+
+            # Inicializa estado se não existir
+            cursor.execute('SELECT COUNT(*) FROM account_state')
+            if cursor.fetchone()[0] == 0:
+                print(f"[INIT_DB] Criando estado inicial com saldo ${INITIAL_BALANCE}")
+                cursor.execute('''
+                    INSERT INTO account_state
+                    (id, balance, peak_balance, last_updated)
+                    VALUES (1, ?, ?, ?)
+                ''', (INITIAL_BALANCE, INITIAL_BALANCE, datetime.now().isoformat()))
+            else:
+                # Verifica estado atual
+                cursor.execute('SELECT balance, position_open, position_type FROM account_state WHERE id = 1')
+                result = cursor.fetchone()
+                balance = result[0]
+                position_open = result[1]
+                position_type = result[2] if len(result) > 2 else None
+                print(f"[INIT_DB] Estado existente - Saldo: ${balance}, Posição: {position_type if position_open else 'Fechada'}")
+
+            # Conta total de trades
+            cursor.execute('SELECT COUNT(*) FROM trades')
+            total_trades = cursor.fetchone()[0]
+            print(f"[INIT_DB] Total de trades no banco: {total_trades}")
+
+            conn.commit()
+            conn.close()
+            print("[INIT_DB] Banco de dados inicializado com sucesso!")
+
+        except Exception as e:
+            print(f"[INIT_DB] ERRO ao inicializar banco: {str(e)}")
+            import traceback
+            traceback.print_exc()
+
+    def load_account(self) -> Dict:
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {", ".join(ACCOUNT_COLUMNS)} FROM account_state WHERE id = 1')
+        row = cursor.fetchone()
+        conn.close()
+        return dict(zip(ACCOUNT_COLUMNS, row)) if row else initial_account()
+
+    def _write(self, cursor, trades: List[Dict], account: Dict):
+        for trade in trades:
+            columns = [c for c in TRADE_COLUMNS if c in trade]
+            cursor.execute(
+                f'INSERT INTO trades ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})',
+                [trade[c] for c in columns]
+            )
+        if account:
+            columns = [c for c in ACCOUNT_COLUMNS if c in account]
+            cursor.execute(
+                f'UPDATE account_state SET {", ".join(f"{c} = ?" for c in columns)} WHERE id = 1',
+                [account[c] for c in columns]
+            )
+
+    def record_fill(self, trade: Dict, account_changes: Dict) -> int:
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        try:
+            cursor = conn.cursor()
+            self._write(cursor, [trade], account_changes)
+            trade_id = cursor.lastrowid if 'id' not in trade else trade['id']
+            # Carimbado depois das escritas e gravado na mesma transação: um único
+            # COMMIT por fill, e nada que possa falhar depois dele
+            trade['committed_at'] = time.time()
+            cursor.execute('UPDATE trades SET committed_at = ? WHERE id = ?',
+                           (trade['committed_at'], trade_id))
+            conn.commit()
+            return trade_id
+        finally:
+            conn.close()
+
+    def write_batch(self, trades: List[Dict], account: Dict):
+        """Grava vários trades (com ids) e o estado da conta em uma transação"""
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        try:
+            self._write(conn.cursor(), trades, account)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def iter_trades(self) -> Iterator[Tuple]:
+        """Todos os trades em ordem de id, com as colunas de TRADE_COLUMNS"""
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT {", ".join(TRADE_COLUMNS)} FROM trades ORDER BY id')
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+
+    def trade_counts(self) -> Dict:
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        cursor = conn.cursor()
+        # Uma única varredura no lugar de uma consulta por contagem
+        cursor.execute('''
+            SELECT
+                COALESCE(SUM(action = 'BUY' AND position_type = 'LONG'), 0),
+                COALESCE(SUM(action = 'SELL' AND position_type = 'SHORT'), 0),
+                COALESCE(SUM(profit_loss != 0), 0),
+                COALESCE(SUM(profit_loss > 0), 0)
+            FROM trades
+        ''')
+        total_longs, total_shorts, total_closed, winning_trades = cursor.fetchone()
+        conn.close()
+        return {
+            'total_longs': total_longs,
+            'total_shorts': total_shorts,
+            'total_closed': total_closed,
+            'winning_trades': winning_trades
+        }
+
+    def recent_trades(self, limit: int = 10) -> List[Tuple]:
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT action, position_type, price, quantity, profit_loss, timestamp
+            FROM trades
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (limit,))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+
+    def last_trade_id(self) -> int:
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        try:
+            return conn.execute('SELECT MAX(id) FROM trades').fetchone()[0] or 0
+        finally:
+            conn.close()
+
+    def trade_id_range(self, since_id: int = 0) -> Tuple[int, int, int]:
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        try:
+            n_rows, first_id, last_id = conn.execute(
+                'SELECT COUNT(*), MIN(id), MAX(id) FROM trades WHERE id > ?', (since_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return n_rows, first_id or 0, last_id or since_id
+
+    def trade_column(self, name: str, after_id: int, last_id: int, limit: int) -> List[Tuple]:
+        if name not in TRADE_COLUMNS:
+            raise ValueError(f'Coluna desconhecida: {name}')
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        try:
+            return conn.execute(
+                f'SELECT id, {name} FROM trades WHERE id > ? AND id <= ? ORDER BY id LIMIT ?',
+                (after_id, last_id, limit)
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def closed_trades(self) -> Tuple[List[Tuple[float, float]], int]:
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT MAX(id) FROM trades')
+            last_id = cursor.fetchone()[0] or 0
+            cursor.execute('''
+                SELECT profit_loss, total_value FROM trades
+                WHERE profit_loss != 0 AND total_value > 0 AND id <= ?
+                ORDER BY id
+            ''', (last_id,))
+            return cursor.fetchall(), last_id
+        finally:
+            conn.close()
+
+
+class MemoryStorage(TradeStorage):
+    """Estado em memória; cada coluna numérica dos trades é um array.array"""
+
+    ACTIONS = ('BUY', 'SELL')
+    POSITION_TYPES = ('LONG', 'SHORT')
+
+    def __init__(self):
+        self.account = initial_account()
+        self.ids = array('q')
+        self.actions = array('b')
+        self.position_types = array('b')
+        self.floats = {name: array('d') for name in TRADE_FLOAT_COLUMNS}
+        self.timings = {name: array('d') for name in TIMING_COLUMNS}  # NaN quando ausente
+        self.timestamps: List[str] = []
+        self.counts = {'total_longs': 0, 'total_shorts': 0, 'total_closed': 0, 'winning_trades': 0}
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _append(self, trade: Dict) -> int:
+        trade_id = trade.get('id') or (self.ids[-1] + 1 if self.ids else 1)
+        action = self.ACTIONS.index(trade['action'])
+        position_type = self.POSITION_TYPES.index(trade['position_type'])
+        profit_loss = trade.get('profit_loss') or 0.0
+
+        self.ids.append(trade_id)
+        self.actions.append(action)
+        self.position_types.append(position_type)
+        for name in TRADE_FLOAT_COLUMNS:
+            self.floats[name].append(trade.get(name) or 0.0)
+        for name in TIMING_COLUMNS:
+            value = trade.get(name)
+            self.timings[name].append(math.nan if value is None else value)
+        self.timestamps.append(trade['timestamp'])
+
+        # Contagens incrementais: estatísticas em O(1)
+        if trade['action'] == 'BUY' and trade['position_type'] == 'LONG':
+            self.counts['total_longs'] += 1
+        elif trade['action'] == 'SELL' and trade['position_type'] == 'SHORT':
+            self.counts['total_shorts'] += 1
+        if profit_loss != 0:
+            self.counts['total_closed'] += 1
+        if profit_loss > 0:
+            self.counts['winning_trades'] += 1
+        return trade_id
+
+    def load_account(self) -> Dict:
+        with self.lock:
+            return dict(self.account)
+
+    def _stamp_committed(self, trade: Dict):
+        # Chamado com o lock, logo depois do _append do trade
+        trade['committed_at'] = time.time()
+        self.timings['committed_at'][-1] = trade['committed_at']
+
+    def record_fill(self, trade: Dict, account_changes: Dict) -> int:
+        with self.lock:
+            trade_id = self._append(trade)
+            self.account.update(account_changes)
+            self._stamp_committed(trade)
+            return trade_id
+
+    def trade_counts(self) -> Dict:
+        with self.lock:
+            return dict(self.counts)
+
+    def recent_trades(self, limit: int = 10) -> List[Tuple]:
+        with self.lock:
+            start = max(0, len(self.ids) - limit)
+            return [
+                (self.ACTIONS[self.actions[i]], self.POSITION_TYPES[self.position_types[i]],
+                 self.floats['price'][i], self.floats['quantity'][i],
+                 self.floats['profit_loss'][i], self.timestamps[i])
+                for i in range(len(self.ids) - 1, start - 1, -1)
+            ]
+
+    def last_trade_id(self) -> int:
+        with self.lock:
+            return self.ids[-1] if self.ids else 0
+
+    def trade_id_range(self, since_id: int = 0) -> Tuple[int, int, int]:
+        with self.lock:
+            # Ids são crescentes, então a busca binária vale direto no array
+            start = bisect.bisect_right(self.ids, since_id)
+            n_rows = len(self.ids) - start
+            if n_rows == 0:
+                return 0, 0, since_id
+            return n_rows, self.ids[start], self.ids[-1]
+
+    def _column_value(self, name: str, i: int):
+        if name == 'id':
+            return self.ids[i]
+        if name == 'action':
+            return self.ACTIONS[self.actions[i]]
+        if name == 'position_type':
+            return self.POSITION_TYPES[self.position_types[i]]
+        if name == 'timestamp':
+            return self.timestamps[i]
+        if name in self.floats:
+            return self.floats[name][i]
+        if name in self.timings:
+            value = self.timings[name][i]
+            return None if math.isnan(value) else value
+        raise ValueError(f'Coluna desconhecida: {name}')
+
+    def trade_column(self, name: str, after_id: int, last_id: int, limit: int) -> List[Tuple]:
+        with self.lock:
+            start = bisect.bisect_right(self.ids, after_id)
+            stop = min(bisect.bisect_right(self.ids, last_id), start + limit)
+            return [(self.ids[i], self._column_value(name, i)) for i in range(start, stop)]
+
+    def closed_trades(self) -> Tuple[List[Tuple[float, float]], int]:
+        with self.lock:
+            rows = [
+                (profit_loss, total_value)
+                for profit_loss, total_value in zip(self.floats['profit_loss'], self.floats['total_value'])
+                if profit_loss != 0 and total_value > 0
+            ]
+            return rows, (self.ids[-1] if self.ids else 0)
+
+
+class HybridStorage(MemoryStorage):
+    """Serve da memória e faz checkpoint no SQLite em segundo plano"""
+
+    def __init__(self, db_path: str, max_unsaved_fills: int = 10,
+                 checkpoint_interval: float = 5.0):
+        super().__init__()
+        self.backend = SQLiteStorage(db_path)
+        self.max_unsaved_fills = max_unsaved_fills
+        self.checkpoint_interval = checkpoint_interval
+        self.pending: List[Dict] = []
+        self.flush_lock = threading.Lock()
+        self._stopped = False
+
+        self.account = self.backend.load_account()
+        for row in self.backend.iter_trades():
+            self._append(dict(zip(TRADE_COLUMNS, row)))
+        print(f"[STORAGE] Modo hybrid: {len(self)} trades carregados, até {max_unsaved_fills} fills sem checkpoint")
+
+        if max_unsaved_fills > 0:
+            self._task = spawn_background(self._checkpoint_loop)
+        atexit.register(self.close)
+
+    def record_fill(self, trade: Dict, account_changes: Dict) -> int:
+        with self.lock:
+            trade_id = self._append(trade)
+            self.account.update(account_changes)
+            # Aplicado na memória conta como gravado; o checkpoint leva o mesmo instante
+            self._stamp_committed(trade)
+            self.pending.append(dict(trade, id=trade_id))
+            must_flush = len(self.pending) > self.max_unsaved_fills
+        if must_flush:
+            # Limite de durabilidade atingido: grava antes de confirmar o fill.
+            # O fill já está aplicado; se a gravação falhar ele segue pendente para o
+            # próximo checkpoint em vez de estourar e dessincronizar o simulador
+            try:
+                self.checkpoint()
+            except Exception as e:
+                print(f"[STORAGE] Checkpoint falhou, {len(self.pending)} fills seguem pendentes: {e}")
+        return trade_id
+
+    def checkpoint(self) -> int:
+        """Grava os fills pendentes e o estado da conta; retorna quantos foram gravados"""
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, []
+                account = dict(self.account)
+            if not batch:
+                return 0
+            try:
+                self.backend.write_batch(batch, account)
+            except Exception:
+                with self.lock:
+                    self.pending = batch + self.pending
+                raise
+            return len(batch)
+
+    def _checkpoint_loop(self):
+        while not self._stopped:
+            time.sleep(self.checkpoint_interval)
+            try:
+                run_blocking(self.checkpoint)
+            except Exception as e:
+                print(f"[STORAGE] Erro no checkpoint: {e}")
+
+    def close(self):
+        self._stopped = True
+        try:
+            saved = self.checkpoint()
+            if saved:
+                print(f"[STORAGE] Checkpoint final: {saved} fills gravados")
+        except Exception as e:
+            print(f"[STORAGE] Erro no checkpoint final: {e}")
+
+
+def create_storage(backend: str, db_path: str, max_unsaved_fills: int = 10,
+                   checkpoint_interval: float = 5.0) -> TradeStorage:
+    """Cria o backend pelo nome: 'sqlite', 'memory' ou 'hybrid'"""
+    if backend == 'sqlite':
+        return SQLiteStorage(db_path)
+    if backend == 'memory':
+        return MemoryStorage()
+    if backend == 'hybrid':
+        return HybridStorage(db_path, max_unsaved_fills, checkpoint_interval)
+    raise ValueError(f'Backend de armazenamento desconhecido: {backend}')
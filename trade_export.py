@@ -0,0 +1,177 @@
+"""
+Exportação colunar binária da tabela de trades
+
+Formato do arquivo (tudo little-endian):
+
+    Cabeçalho (40 bytes)
+        magic        8s   b'TRDCOLS\\0'
+        version      u2
+        n_columns    u2
+        reserved     u4
+        n_rows       u8
+        first_id     i8   (0 se não houver linhas)
+        last_id      i8   (use como --since na próxima exportação incremental)
+
+    Descritores de coluna (24 bytes cada, na ordem dos dados)
+        name         16s  nome da coluna, preenchido com zeros
+        dtype        8s   dtype NumPy, ex: b'<f8' ou b'<i8'
+
+    Dados: cada coluna é um array contíguo de n_rows valores de 8 bytes.
+
+Como o cabeçalho e os descritores têm tamanho múltiplo de 8, todos os arrays
+ficam alinhados e podem ser lidos com numpy.frombuffer ou numpy.memmap sem cópia.
+A coluna `timestamp` é o epoch em milissegundos (int64).
+
+Uso:
+    python trade_export.py saida.bin [--db data/trading.db] [--since ID] [--chunk N]
+"""
+
+import argparse
+import math
+import struct
+import sys
+from array import array
+from datetime import datetime
+from typing import Dict, Iterator, Tuple
+
+from concurrency import run_blocking
+from config import DB_PATH
+from storage import SQLiteStorage, TradeStorage
+
+MAGIC = b'TRDCOLS\0'
+FORMAT_VERSION = 1
+HEADER_STRUCT = struct.Struct('<8sHHIQqq')
+COLUMN_STRUCT = struct.Struct('<16s8s')
+DEFAULT_CHUNK_ROWS = 4096
+
+# (nome, dtype NumPy, typecode do módulo array)
+COLUMNS = [
+    ('id', '<i8', 'q'),
+    ('price', '<f8', 'd'),
+    ('quantity', '<f8', 'd'),
+    ('total_value', '<f8', 'd'),
+    ('commission', '<f8', 'd'),
+    ('balance_after', '<f8', 'd'),
+    ('profit_loss', '<f8', 'd'),
+    ('timestamp', '<i8', 'q'),
+]
+
+
+def timestamp_to_epoch_ms(value) -> int:
+    """Converte o timestamp salvo no banco (ISO ou epoch s/ms) para epoch em milissegundos"""
+    try:
+        # Trades antigos podem ter o `time` numérico do payload gravado como texto
+        number = float(value)
+    except (ValueError, TypeError):
+        pass
+    else:
+        if math.isfinite(number):
+            return int(number if number > 1e11 else number * 1000)
+    try:
+        return int(datetime.fromisoformat(value).timestamp() * 1000)
+    except (ValueError, TypeError):
+        print(f"[EXPORT] Timestamp ilegível exportado como 0: {value!r}")
+        return 0
+
+
+def build_header(n_rows: int, first_id: int, last_id: int) -> bytes:
+    """Monta o cabeçalho e os descritores de coluna"""
+    parts = [HEADER_STRUCT.pack(MAGIC, FORMAT_VERSION, len(COLUMNS), 0, n_rows, first_id, last_id)]
+    for name, dtype, _ in COLUMNS:
+        parts.append(COLUMN_STRUCT.pack(name.encode(), dtype.encode()))
+    return b''.join(parts)
+
+
+def read_header(buffer) -> Tuple[Dict, list, int]:
+    """Lê o cabeçalho; retorna (info, [(nome, dtype)], offset dos dados)"""
+    magic, version, n_columns, _, n_rows, first_id, last_id = HEADER_STRUCT.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError('Arquivo não é uma exportação colunar de trades')
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Versão de formato não suportada: {version}')
+
+    offset = HEADER_STRUCT.size
+    columns = []
+    for _ in range(n_columns):
+        name, dtype = COLUMN_STRUCT.unpack_from(buffer, offset)
+        columns.append((name.rstrip(b'\0').decode(), dtype.rstrip(b'\0').decode()))
+        offset += COLUMN_STRUCT.size
+
+    info = {'n_rows': n_rows, 'first_id': first_id, 'last_id': last_id}
+    return info, columns, offset
+
+
+def load_columns(buffer) -> Dict:
+    """Carrega uma exportação como dicionário de arrays NumPy (sem cópia)
+
+    `buffer` pode ser bytes, memoryview ou numpy.memmap(path, dtype='u1').
+    """
+    import numpy as np
+
+    info, columns, offset = read_header(buffer)
+    n_rows = info['n_rows']
+    result = {}
+    for name, dtype in columns:
+        result[name] = np.frombuffer(buffer, dtype=dtype, count=n_rows, offset=offset)
+        offset += n_rows * 8
+    return result
+
+
+def iter_export(storage: TradeStorage, since_id: int = 0,
+                chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Gera a exportação em blocos de bytes, coluna por coluna
+
+    Os trades são apenas inseridos, então fixar o intervalo de ids no início
+    garante que todas as colunas tenham o mesmo número de linhas mesmo que
+    novos fills cheguem durante a exportação. Cada bloco é uma leitura
+    paginada pelo id no backend de armazenamento (ver storage.py), feita no pool
+    de threads para não travar o loop de eventos enquanto a resposta é transmitida.
+    """
+    n_rows, first_id, last_id = run_blocking(storage.trade_id_range, since_id)
+
+    yield build_header(n_rows, first_id, last_id)
+
+    for name, _, typecode in COLUMNS:
+        after_id = since_id
+        while True:
+            rows = run_blocking(storage.trade_column, name, after_id, last_id, chunk_rows)
+            if not rows:
+                break
+            after_id = rows[-1][0]
+            if name == 'timestamp':
+                values = array(typecode, (timestamp_to_epoch_ms(r[1]) for r in rows))
+            else:
+                values = array(typecode, (r[1] or 0 for r in rows))
+            if sys.byteorder != 'little':
+                values.byteswap()
+            yield values.tobytes()
+
+
+def export_to_file(path: str, storage: TradeStorage, since_id: int = 0,
+                   chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Dict:
+    """Grava a exportação em `path` e retorna as informações do cabeçalho"""
+    with open(path, 'wb') as f:
+        chunks = iter_export(storage, since_id, chunk_rows)
+        header = next(chunks)
+        f.write(header)
+        for chunk in chunks:
+            f.write(chunk)
+    info, _, _ = read_header(header)
+    return info
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exporta a tabela de trades em formato colunar binário')
+    parser.add_argument('output', help='Arquivo de saída')
+    parser.add_argument('--db', default=DB_PATH, help='Caminho do banco SQLite')
+    parser.add_argument('--since', type=int, default=0, help='Exporta apenas trades com id maior que este')
+    parser.add_argument('--chunk', type=int, default=DEFAULT_CHUNK_ROWS, help='Linhas por bloco')
+    args = parser.parse_args()
+
+    info = export_to_file(args.output, SQLiteStorage(args.db), args.since, args.chunk)
+    print(f"[EXPORT] {info['n_rows']} trades exportados para {args.output} "
+          f"(ids {info['first_id']}..{info['last_id']})")
+
+
+if __name__ == '__main__':
+    main()
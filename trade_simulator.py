@@ -0,0 +1,322 @@
+"""
+Simulador de trades (paper trading)
+
+O estado fica em um backend de armazenamento plugável (ver storage.py):
+SQLite por padrão, ou memória / hybrid via STORAGE_BACKEND.
+"""
+
+import time
+from typing import Dict, Optional
+
+from concurrency import make_lock, run_blocking
+from config import (
+    INITIAL_BALANCE, COMMISSION_RATE, DB_PATH,
+    STORAGE_BACKEND, HYBRID_MAX_UNSAVED_FILLS, CHECKPOINT_INTERVAL
+)
+from storage import TIMING_COLUMNS, TradeStorage, create_storage
+
+
+class TradeSimulator:
+    def __init__(self, db_path: str = DB_PATH, storage: Optional[TradeStorage] = None):
+        self.db_path = db_path
+        self.fill_lock = make_lock()
+        # `is not None`: um MemoryStorage vazio é falso (tem __len__)
+        self.storage = storage if storage is not None else create_storage(
+            STORAGE_BACKEND, db_path, HYBRID_MAX_UNSAVED_FILLS, CHECKPOINT_INTERVAL
+        )
+        self.current_position = None
+        self.position_type = None  # 'LONG' ou 'SHORT'
+        self.load_state()
+
+    def load_state(self):
+        """Carrega o estado atual da conta"""
+        state = self.storage.load_account()
+
+        if state['position_open'] == 1:
+            self.current_position = {
+                'price': state['position_price'],
+                'quantity': state['position_quantity'],
+                'value': state['position_value']
+            }
+            self.position_type = state['position_type']
+            print(f"[LOAD_STATE] Posição {self.position_type} carregada - Preço: ${state['position_price']}")
+        else:
+            self.current_position = None
+            self.position_type = None
+
+    def get_balance(self) -> float:
+        """Retorna o saldo atual"""
+        return self.storage.load_account()['balance']
+
+    def _record_fill(self, trade: Dict, account_changes: Dict, timing: Optional[Dict]):
+        """Grava o fill com os tempos de latência, se houver"""
+        if timing is not None:
+            trade.update({name: timing.get(name) for name in TIMING_COLUMNS if name != 'committed_at'})
+        trade_id = self.storage.record_fill(trade, account_changes)
+        if timing is not None:
+            timing['committed_at'] = trade['committed_at']
+            timing['trade_id'] = trade_id
+
+    def _open_position(self, action: str, position_type: str, price: float, timestamp: str,
+                       timing: Optional[Dict] = None) -> Dict:
+        """Abre uma posição com 100% do saldo"""
+        if self.current_position:
+            return {'status': 'error', 'message': f'Já existe uma posição {self.position_type} aberta'}
+
+        balance = self.get_balance()
+        commission = balance * COMMISSION_RATE
+        available_for_trade = balance - commission
+        quantity = available_for_trade / price
+
+        self._record_fill(
+            {
+                'action': action,
+                'position_type': position_type,
+                'price': price,
+                'quantity': quantity,
+                'total_value': available_for_trade,
+                'commission': commission,
+                'balance_after': 0,
+                'profit_loss': 0,
+                'timestamp': timestamp
+            },
+            {
+                'position_open': 1,
+                'position_type': position_type,
+                'position_price': price,
+                'position_quantity': quantity,
+                'position_value': available_for_trade,
+                'balance': 0,
+                'last_updated': timestamp
+            },
+            timing
+        )
+
+        self.current_position = {
+            'price': price,
+            'quantity': quantity,
+            'value': available_for_trade
+        }
+        self.position_type = position_type
+
+        return {
+            'status': 'success',
+            'action': action,
+            'position_type': position_type,
+            'price': price,
+            'quantity': quantity,
+            'commission': commission,
+            'investment': available_for_trade
+        }
+
+    def _close_position(self, action: str, price: float, timestamp: str,
+                        net_value: float, gross_value: float, commission: float,
+                        profit_loss: float, timing: Optional[Dict] = None) -> Dict:
+        """Registra o fechamento e limpa a posição atual"""
+        position_quantity = self.current_position['quantity']
+        position_value = self.current_position['value']
+        entry_price = self.current_position['price']
+        position_type = self.position_type
+
+        account = self.storage.load_account()
+        self._record_fill(
+            {
+                'action': action,
+                'position_type': position_type,
+                'price': price,
+                'quantity': position_quantity,
+                'total_value': gross_value,
+                'commission': commission,
+                'balance_after': net_value,
+                'profit_loss': profit_loss,
+                'timestamp': timestamp
+            },
+            {
+                'position_open': 0,
+                'position_type': None,
+                'position_price': None,
+                'position_quantity': None,
+                'position_value': None,
+                'balance': net_value,
+                'total_profit': account['total_profit'] + profit_loss,
+                'peak_balance': max(account['peak_balance'], net_value),
+                'last_updated': timestamp
+            },
+            timing
+        )
+
+        # Prepara resultado antes de limpar a posição
+        result = {
+            'status': 'success',
+            'action': action,
+            'position_type': position_type,
+            'entry_price': entry_price,
+            'exit_price': price,
+            'quantity': position_quantity,
+            'gross_value': gross_value,
+            'commission': commission,
+            'net_value': net_value,
+            'profit_loss': profit_loss,
+            'profit_percentage': (profit_loss / position_value) * 100
+        }
+
+        # Limpa a posição atual
+        self.current_position = None
+        self.position_type = None
+
+        return result
+
+    def open_long(self, price: float, timestamp: str, timing: Optional[Dict] = None) -> Dict:
+        """Abre uma posição LONG (compra) com 100% do saldo"""
+        return self._open_position('BUY', 'LONG', price, timestamp, timing)
+
+    def open_short(self, price: float, timestamp: str, timing: Optional[Dict] = None) -> Dict:
+        """Abre uma posição SHORT (venda a descoberto) com 100% do saldo"""
+        return self._open_position('SELL', 'SHORT', price, timestamp, timing)
+
+    def close_long(self, price: float, timestamp: str, timing: Optional[Dict] = None) -> Dict:
+        """Fecha a posição LONG (vende)"""
+        if not self.current_position or self.position_type != 'LONG':
+            return {'status': 'error', 'message': 'Nenhuma posição LONG aberta'}
+
+        # Calcula o valor bruto da venda
+        gross_value = self.current_position['quantity'] * price
+        commission = gross_value * COMMISSION_RATE
+        net_value = gross_value - commission
+
+        # Calcula lucro/prejuízo (LONG: ganho quando preço sobe)
+        profit_loss = net_value - self.current_position['value']
+
+        return self._close_position('SELL', price, timestamp, net_value, gross_value, commission,
+                                    profit_loss, timing)
+
+    def close_short(self, price: float, timestamp: str, timing: Optional[Dict] = None) -> Dict:
+        """Fecha a posição SHORT (compra de volta)"""
+        if not self.current_position or self.position_type != 'SHORT':
+            return {'status': 'error', 'message': 'Nenhuma posição SHORT aberta'}
+
+        # Calcula o valor bruto da compra de volta
+        position_value = self.current_position['value']
+        gross_value = self.current_position['quantity'] * price
+        commission = gross_value * COMMISSION_RATE
+        cost_to_close = gross_value + commission
+
+        # Calcula lucro/prejuízo (SHORT: ganho quando preço cai)
+        profit_loss = position_value - cost_to_close
+        net_value = position_value + profit_loss
+
+        return self._close_position('BUY', price, timestamp, net_value, gross_value, commission,
+                                    profit_loss, timing)
+
+    def process_signal(self, action: str, price: float, timestamp: str,
+                       timing: Optional[Dict] = None) -> Dict:
+        """Executa um sinal 'buy' ou 'sell' de acordo com a posição atual
+
+        Fills são serializados pelo lock e o I/O roda no pool de threads.
+        Se `timing` for passado (received_at, signal_skew_ms), ele é gravado no
+        trade e completado com processing_started_at, committed_at e trade_id.
+        """
+        with self.fill_lock:
+            return run_blocking(self._execute_signal, action, price, timestamp, timing)
+
+    def _execute_signal(self, action: str, price: float, timestamp: str,
+                        timing: Optional[Dict] = None) -> Dict:
+        if timing is not None:
+            timing['processing_started_at'] = time.time()
+        result = None
+
+        if action == 'buy':
+            if self.position_type == 'SHORT':
+                # BUY com SHORT aberto = Fecha SHORT
+                result = self.close_short(price, timestamp, timing)
+                print(f"[TRADE] SHORT fechado - Preço: ${price}, Resultado: {result}")
+            elif not self.current_position:
+                # BUY sem posição = Abre LONG
+                result = self.open_long(price, timestamp, timing)
+                print(f"[TRADE] LONG aberto - Preço: ${price}, Resultado: {result}")
+            else:
+                result = {'status': 'error', 'message': f'Já existe posição {self.position_type} aberta'}
+
+        elif action == 'sell':
+            if self.position_type == 'LONG':
+                # SELL com LONG aberto = Fecha LONG
+                result = self.close_long(price, timestamp, timing)
+                print(f"[TRADE] LONG fechado - Preço: ${price}, Resultado: {result}")
+            elif not self.current_position:
+                # SELL sem posição = Abre SHORT
+                result = self.open_short(price, timestamp, timing)
+                print(f"[TRADE] SHORT aberto - Preço: ${price}, Resultado: {result}")
+            else:
+                result = {'status': 'error', 'message': f'Já existe posição {self.position_type} aberta'}
+        else:
+            result = {'status': 'error', 'message': f'Ação desconhecida: {action}'}
+
+        return result
+
+    def get_statistics(self) -> Dict:
+        """Retorna estatísticas do trading"""
+        return run_blocking(self._query_statistics)
+
+    def _query_statistics(self) -> Dict:
+        try:
+            counts = self.storage.trade_counts()
+            account = self.storage.load_account()
+            recent_trades = self.storage.recent_trades(10)
+
+            total_longs = counts['total_longs']
+            total_shorts = counts['total_shorts']
+            total_closed = counts['total_closed']
+            total_profit = account['total_profit'] or 0
+            balance = account['balance']
+            peak = account['peak_balance']
+            position_open = account['position_open']
+            position_type = account['position_type']
+
+            # Calcula lucro/perda em porcentagem
+            profit_percentage = ((balance - INITIAL_BALANCE) / INITIAL_BALANCE) * 100
+
+            # Calcula drawdown máximo
+            max_drawdown = 0
+            if peak > 0:
+                max_drawdown = ((peak - balance) / peak) * 100 if balance < peak else 0
+
+            # Taxa de vitória (trades fechados com lucro)
+            win_rate = (counts['winning_trades'] / total_closed * 100) if total_closed > 0 else 0
+
+            stats = {
+                'total_longs': total_longs,
+                'total_shorts': total_shorts,
+                'total_closed': total_closed,
+                'total_profit_usd': round(total_profit, 2),
+                'total_profit_percentage': round(profit_percentage, 2),
+                'current_balance': round(balance, 2),
+                'initial_balance': INITIAL_BALANCE,
+                'max_drawdown': round(max_drawdown, 2),
+                'win_rate': round(win_rate, 2),
+                'recent_trades': recent_trades,
+                'position_open': position_open == 1,
+                'position_type': position_type
+            }
+
+            print(f"[GET_STATISTICS] Longs={total_longs}, Shorts={total_shorts}, Fechados={total_closed}, Balance={balance}")
+            return stats
+
+        except Exception as e:
+            print(f"[GET_STATISTICS] Erro: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            # Retorna valores padrão em caso de erro
+            return {
+                'total_longs': 0,
+                'total_shorts': 0,
+                'total_closed': 0,
+                'total_profit_usd': 0.0,
+                'total_profit_percentage': 0.0,
+                'current_balance': INITIAL_BALANCE,
+                'initial_balance': INITIAL_BALANCE,
+                'max_drawdown': 0.0,
+                'win_rate': 0.0,
+                'recent_trades': [],
+                'position_open': False,
+                'position_type': None
+            }
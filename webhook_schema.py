@@ -0,0 +1,183 @@
+"""
+Esquema compilado do payload do webhook
+
+Cobre os dois formatos aceitos:
+    TradingView:    {"action": "buy", "price": 3500.5, "time": "..."}
+    signal_sender:  {"data": {"action": "buy", ...}, "price": "3500.5", "time": "..."}
+
+O esquema é compilado uma única vez em uma lista de extratores, então validar um
+payload é só percorrer essa lista, sem sondar formatos a cada requisição.
+"""
+
+import math
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Tuple
+
+import json_codec
+
+MAX_WEBHOOK_BYTES = 4096
+MAX_STRING_LENGTH = 128
+
+
+class SchemaError(ValueError):
+    """Payload inválido; `errors` mapeia campo -> mensagem"""
+
+    def __init__(self, errors: Dict[str, str], status: int = 400):
+        super().__init__('; '.join(f'{k}: {v}' for k, v in errors.items()))
+        self.errors = errors
+        self.status = status
+
+
+# Cada campo: caminhos alternativos (o primeiro encontrado vence), tipo e regras
+WEBHOOK_SCHEMA = {
+    'action': {
+        'paths': (('data', 'action'), ('action',)),
+        'type': 'string',
+        'required': True,
+        'lower': True,
+        'choices': ('buy', 'sell'),
+    },
+    'price': {
+        'paths': (('price',),),
+        'type': 'number',
+        'required': True,
+        'positive': True,
+    },
+    'time': {
+        'paths': (('time',),),
+        'type': 'timestamp',  # ISO ou epoch s/ms; epochs viram ISO UTC
+        'required': False,
+    },
+}
+# Outros campos (symbol, contracts, ...) não são usados e ficam fora do esquema:
+# placeholders do TradingView como "{{strategy.order.contracts}}" não podem barrar o sinal
+
+_MISSING = object()
+
+
+def _compile_getter(path: Tuple[str, ...]) -> Callable:
+    if len(path) == 1:
+        key = path[0]
+        return lambda payload: payload.get(key, _MISSING)
+
+    outer, inner = path
+
+    def getter(payload):
+        nested = payload.get(outer)
+        if isinstance(nested, dict):
+            return nested.get(inner, _MISSING)
+        return _MISSING
+    return getter
+
+
+def _compile_coercer(name: str, rules: Dict) -> Callable:
+    if rules['type'] == 'number':
+        positive = rules.get('positive', False)
+
+        def coerce_number(value):
+            if isinstance(value, bool):
+                raise SchemaError({name: 'deve ser numérico'})
+            if isinstance(value, str):
+                if len(value) > MAX_STRING_LENGTH:
+                    raise SchemaError({name: 'texto muito longo'})
+                try:
+                    value = float(value)
+                except ValueError:
+                    raise SchemaError({name: 'deve ser numérico'})
+            elif isinstance(value, (int, float)):
+                value = float(value)
+            else:
+                raise SchemaError({name: 'deve ser numérico'})
+            if not math.isfinite(value):
+                raise SchemaError({name: 'deve ser finito'})
+            if positive and value <= 0:
+                raise SchemaError({name: 'deve ser maior que zero'})
+            return value
+        return coerce_number
+
+    if rules['type'] == 'timestamp':
+        def coerce_timestamp(value):
+            if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                raise SchemaError({name: 'deve ser texto ou numérico'})
+            if isinstance(value, str):
+                if len(value) > MAX_STRING_LENGTH:
+                    raise SchemaError({name: 'texto muito longo'})
+                try:
+                    value = float(value)
+                except ValueError:
+                    return value  # ISO ou outro texto, gravado como veio
+            if not math.isfinite(value):
+                raise SchemaError({name: 'deve ser finito'})
+            # Epoch em s ou ms; o trade guarda ISO, como os sinais com data
+            seconds = value / 1000 if value > 1e11 else value
+            try:
+                return datetime.fromtimestamp(seconds, timezone.utc).isoformat()
+            except (OverflowError, OSError, ValueError):
+                raise SchemaError({name: 'epoch fora do intervalo'})
+        return coerce_timestamp
+
+    lower = rules.get('lower', False)
+    choices = rules.get('choices')
+
+    def coerce_string(value):
+        if not isinstance(value, str):
+            raise SchemaError({name: 'deve ser texto'})
+        if len(value) > MAX_STRING_LENGTH:
+            raise SchemaError({name: 'texto muito longo'})
+        if lower:
+            value = value.lower()
+        if choices and value not in choices:
+            raise SchemaError({name: f'valor desconhecido: {value}; use {", ".join(choices)}'})
+        return value
+    return coerce_string
+
+
+def compile_schema(schema: Dict) -> Callable[[Dict], Dict]:
+    """Compila o esquema em um validador `payload -> campos normalizados`"""
+    fields: List[Tuple] = []
+    for name, rules in schema.items():
+        getters = tuple(_compile_getter(p) for p in rules['paths'])
+        fields.append((name, getters, _compile_coercer(name, rules), rules.get('required', False)))
+
+    def validate(payload) -> Dict:
+        if not isinstance(payload, dict):
+            raise SchemaError({'body': 'o payload deve ser um objeto JSON'})
+
+        result = {}
+        errors = {}
+        for name, getters, coerce, required in fields:
+            value = _MISSING
+            for getter in getters:
+                value = getter(payload)
+                if value is not _MISSING:
+                    break
+            if value is _MISSING or value is None or value == '':
+                if required:
+                    errors[name] = 'campo obrigatório'
+                continue
+            try:
+                result[name] = coerce(value)
+            except SchemaError as e:
+                errors.update(e.errors)
+
+        if errors:
+            raise SchemaError(errors)
+        return result
+
+    return validate
+
+
+validate_webhook = compile_schema(WEBHOOK_SCHEMA)
+
+
+def parse_webhook(body: bytes) -> Dict:
+    """Valida tamanho, decodifica e aplica o esquema ao corpo bruto"""
+    if not body:
+        raise SchemaError({'body': 'dados vazios'})
+    if len(body) > MAX_WEBHOOK_BYTES:
+        raise SchemaError({'body': f'payload maior que {MAX_WEBHOOK_BYTES} bytes'}, status=413)
+    try:
+        payload = json_codec.loads(body)
+    except ValueError:
+        raise SchemaError({'body': 'JSON inválido'})
+    return validate_webhook(payload)